@@ -1,52 +1,20 @@
+import json
+import altair as alt
 import streamlit as st
+import metrics
+import scheduler
+from archive import maintain_horizon
 from datetime import datetime, timedelta, date, time
-from scheduler import Event
-import json
-from pathlib import Path
-
-def load_json(filename):
-    return json.loads(Path(filename).read_text())
-
-def save_to_json(filename, data): 
-    Path(filename).write_text(json.dumps(data))
+from scheduler import Event, availability_cache, capacity_timeline, explanation_messages, get_suggestion_service, next_checkpoint
+from service import get_background_service
+from storage import get_event_store, load_json
     
 def save_event(data):
-    events_data = load_json("events.json")
-    if len(events_data) == 0:
-        events_data.append("1")
-        save_to_json("events.json", events_data)
-    events_data = load_json("events.json")
-    next_id = int(events_data[-1])
-    events_data.pop()
-    if data["type"] == "One-time event":
-        data["id"] = str(next_id)
-        events_data.append(data)
-        next_id += 1
-        events_data.append(str(next_id))
-    else:
-        base_start = datetime.fromisoformat(data["start_datetime"])
-        base_end = datetime.fromisoformat(data["end_datetime"])
-        
-        for i in range(data["repeats"]):
-            event_copy = data.copy()
-            event_copy["id"] = str(next_id + i)
-            event_copy["start_datetime"] = (base_start + timedelta(days=i * data["interval"])).isoformat()
-            event_copy["end_datetime"] = (base_end + timedelta(days=i * data["interval"])).isoformat()
-            events_data.append(event_copy)
-        next_id += data["repeats"]
-        events_data.append(str(next_id))
-    save_to_json("events.json", events_data)
+    is_reserved, error_messages, event_ids = scheduler.reserve_event(data)
+    return is_reserved, error_messages
     
 def delete_event(event_id): 
-    events_data = load_json("events.json")
-    for i in range(len(events_data)):
-        if type(events_data[i]) == str:
-            pass
-        else:
-            if str(events_data[i].get("id")) == str(event_id):
-                events_data.pop(i)
-                break
-    save_to_json("events.json", events_data)
+    scheduler.remove_event(event_id)
 
 def home():
     st.title("Home page")
@@ -73,19 +41,15 @@ def home():
 
 def add():
     st.title("Add events")
-    now = datetime.now()
-    if now.hour == 23:
-        default_start_date = (now + timedelta(days=1)).date()
-        default_end_date = (now + timedelta(days=1)).date()
-    elif now.hour == 22:
-        default_start_date = now.date()
-        default_end_date = (now + timedelta(days=1)).date()
-    else:
-        default_start_date = now.date()
-        default_end_date = now.date()
-    next_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-    default_start_time = next_hour.time()
-    default_end_time = (next_hour + timedelta(hours=1)).time()
+    scheduler.refresh_config()
+    # Time inputs move in steps of the configured resolution.
+    step = scheduler.CHECKPOINT_STEP
+    default_start = next_checkpoint()
+    default_end = default_start + timedelta(hours=1)
+    default_start_date = default_start.date()
+    default_end_date = default_end.date()
+    default_start_time = default_start.time()
+    default_end_time = default_end.time()
     
     if "scheduled_successfully" not in st.session_state:
         st.session_state.scheduled_successfully = False
@@ -97,9 +61,52 @@ def add():
         st.session_state.conflict_errors = None
     if "not_next_available_datetime" not in st.session_state:
         st.session_state.not_next_available_datetime = None
+    if "search_job" not in st.session_state:
+        st.session_state.search_job = None
 
     def reset_success_state():
         st.session_state.scheduled_successfully = False
+        # A suggestion was searched for the form as it was, so an edit drops it.
+        if st.session_state.next_available_datetime is not None:
+            get_suggestion_service().release(st.session_state.next_available_datetime["key"])
+            st.session_state.next_available_datetime = None
+            st.session_state.conflict_errors = None
+        if st.session_state.search_job is not None:
+            st.session_state.search_job = None
+            st.session_state.conflict_errors = None
+
+    def search_next_available(data, lanes):
+        # The search runs as a job on the background service, so this session's
+        # thread is free while it runs; wait_for_search polls for the result.
+        payload = dict(data, locks=[]) if lanes is not None else data
+        st.session_state.search_job = {"job": get_background_service().submit("check", payload), "data": data, "lanes": lanes}
+        st.rerun()
+
+    @st.fragment(run_every=1)
+    def wait_for_search():
+        search = st.session_state.search_job
+        status = get_background_service().poll(search["job"])
+        if status is not None and status["state"] == "pending":
+            st.info("🔎 Searching for the next available time...")
+            return
+        st.session_state.search_job = None
+        if status is None or status["state"] == "failed":
+            st.session_state.not_next_available_datetime = "The search for the next available time failed, please try again."
+        elif status["result"]["status"] == "rejected":
+            st.session_state.not_next_available_datetime = "No available datetime found in the next 60 days"
+        else:
+            result = status["result"]
+            if result["status"] == "suggested":
+                slot = (datetime.fromisoformat(result["start_datetime"]), datetime.fromisoformat(result["end_datetime"]), result["locks"])
+            else:
+                # The requested time was freed while the search ran.
+                slot = (datetime.fromisoformat(search["data"]["start_datetime"]), datetime.fromisoformat(search["data"]["end_datetime"]), search["data"]["locks"])
+            key, slot = get_suggestion_service().suggest(search["data"], search["lanes"], slot)
+            st.session_state.next_available_datetime = {
+                "key": key,
+                "data": search["data"]
+            }
+        st.rerun()
 
     st.subheader("Select the type of event:")
     type = st.pills(
@@ -122,7 +129,7 @@ def add():
             start_time = st.time_input(
                 ":material/schedule: Start time of the event",
                 value=default_start_time,
-                step=3600,
+                step=step,
                 on_change=reset_success_state
             )
         end_date_column, end_time_column = st.columns(2)
@@ -136,7 +143,7 @@ def add():
             end_time = st.time_input(
                 ":material/schedule: End time of the event",
                 value=default_end_time,
-                step=3600,
+                step=step,
                 on_change=reset_success_state
             )
 
@@ -175,7 +182,7 @@ def add():
             start_time = st.time_input(
                 ":material/schedule: Start time of the first event in the series",
                 value=default_start_time,
-                step=3600,
+                step=step,
                 on_change=reset_success_state
             )
         end_date_column, end_time_column = st.columns(2)
@@ -189,7 +196,7 @@ def add():
             end_time = st.time_input(
                 ":material/schedule: End time of the first event in the series",
                 value=default_end_time,
-                step=3600,
+                step=step,
                 on_change=reset_success_state
             )
 
@@ -249,12 +256,19 @@ def add():
                 on_change=reset_success_state
             )
             st.markdown(":material/grid_view: Locks")
-            locks = st.multiselect(
-                "",
-                ["A1", "A2", "A3", "C1", "C2", "C3", "P1", "P2", "P3"],
-                label_visibility="collapsed",
+            automatic_locks = st.checkbox(
+                "Pick the locks automatically",
                 on_change=reset_success_state
             )
+            if automatic_locks:
+                locks = []
+            else:
+                locks = st.multiselect(
+                    "",
+                    ["A1", "A2", "A3", "C1", "C2", "C3", "P1", "P2", "P3"],
+                    label_visibility="collapsed",
+                    on_change=reset_success_state
+                )
             if subtype == "Transit":
                 st.write("---")
                 st.markdown(":material/sailing: Vessel size")
@@ -304,12 +318,27 @@ def add():
                     st.session_state.next_available_datetime = None
                     st.session_state.conflict_errors = None
                     st.rerun()
+            elif st.session_state.search_job is not None:
+                if st.session_state.conflict_errors:
+                    st.error(st.session_state.conflict_errors)
+                wait_for_search()
+                if st.button("Cancel and edit manually"):
+                    st.session_state.search_job = None
+                    st.session_state.conflict_errors = None
+                    st.rerun()
             elif st.session_state.next_available_datetime is not None:
                 if st.session_state.conflict_errors:
                     st.error(st.session_state.conflict_errors)
                 suggestion = st.session_state.next_available_datetime
-                start = str(suggestion['start_datetime']).replace("T", " ")
-                end = str(suggestion['end_datetime']).replace("T", " ")
+                # The service re-runs the search only if the schedule changed around it.
+                slot = get_suggestion_service().current(suggestion["key"])
+                if slot is None:
+                    get_suggestion_service().release(suggestion["key"])
+                    st.session_state.next_available_datetime = None
+                    st.session_state.not_next_available_datetime = "No available datetime found in the next 60 days"
+                    st.rerun()
+                start = str(slot[0])
+                end = str(slot[1])
                     
                 st.info(f"💡 **Suggested next available time:**\nFrom `{start}` to `{end}`")              
                     
@@ -317,15 +346,24 @@ def add():
                 with reschedule:
                     if st.button("Reschedule at suggested time", type="primary"):
                         suggestion_data = suggestion["data"]
-                        suggestion_data["start_datetime"] = suggestion["start_datetime"]
-                        suggestion_data["end_datetime"] = suggestion["end_datetime"]
-                        save_event(suggestion_data)
+                        suggestion_data["start_datetime"] = slot[0].isoformat()
+                        suggestion_data["end_datetime"] = slot[1].isoformat()
+                        suggestion_data["locks"] = slot[2]
+                        get_suggestion_service().release(suggestion["key"])
+                        is_reserved, error_messages = save_event(suggestion_data)
                         st.session_state.next_available_datetime = None
                         st.session_state.conflict_errors = None
-                        st.session_state.scheduled_successfully = True
+                        if is_reserved:
+                            st.session_state.scheduled_successfully = True
+                        else:
+                            error_message = "The suggested time was booked in the meantime, because:"
+                            for error in error_messages:
+                                error_message += (f"\n + {error}")
+                            st.session_state.not_next_available_datetime = error_message
                         st.rerun()
                 with cancel:
                     if st.button("Cancel and edit manually"):
+                        get_suggestion_service().release(suggestion["key"])
                         st.session_state.next_available_datetime = None
                         st.session_state.conflict_errors = None
                         st.rerun()
@@ -333,6 +371,11 @@ def add():
             else:
                 if st.button("Schedule event", type="primary"):
                     event = Event(data)
+                    lanes = None
+                    if automatic_locks:
+                        lanes = event.lane_options()
+                        event.locks = event.assign_lane() or list(lanes[0])
+                        data["locks"] = event.locks
                         
                     if type == "One-time event":
                         if not event.static_validations():
@@ -344,24 +387,22 @@ def add():
                             is_valid, error_messages = event.validate_resources_availability()
                             if not is_valid:
                                 error_message = "Resource conflict. The event cannot be scheduled, because:"
-                                for error in error_messages:
+                                # The background search below proposes the next free start.
+                                for error in explanation_messages(event.explain_conflicts(search=False)):
                                     error_message += (f"\n + {error}")
                                 st.session_state.conflict_errors = error_message
                                     
-                                has_next, message, start, end = event.one_time_event_next_available_datetime()
-                                if not has_next:
-                                    st.session_state.not_next_available_datetime = message
-                                else:
-                                    st.session_state.next_available_datetime = {
-                                        "data": data,
-                                        "start_datetime": start.isoformat(),
-                                        "end_datetime": end.isoformat()
-                                    }
-                                    st.rerun()
+                                search_next_available(data, lanes)
                             else:
-                                save_event(data)
-                                st.session_state.scheduled_successfully = True
-                                st.rerun()
+                                is_reserved, error_messages = save_event(data)
+                                if is_reserved:
+                                    st.session_state.scheduled_successfully = True
+                                    st.rerun()
+                                else:
+                                    error_message = "Resource conflict. The event cannot be scheduled, because:"
+                                    for error in error_messages:
+                                        error_message += (f"\n + {error}")
+                                    st.error(error_message)
                     else:
                         if not event.static_validations_recurrences():
                             error_message = "Error: The recurring event is not valid, because:"
@@ -372,89 +413,187 @@ def add():
                             is_valid, error_messages = event.validate_recurrences()
                             if not is_valid:
                                 error_message = "Resource conflict. The recurring event cannot be scheduled, because:"
-                                for error in error_messages:
+                                offsets = [timedelta(days=i * event.interval) for i in range(event.repeats)]
+                                for error in explanation_messages(event.explain_conflicts(offsets, search=False)):
                                     error_message += (f"\n + {error}")
                                 st.session_state.conflict_errors = error_message
                                     
-                                has_next, message, start, end = event.recurring_event_next_available_datetime()
-                                if not has_next:
-                                    st.session_state.not_next_available_datetime = message
-                                else:
-                                    st.session_state.next_available_datetime = {
-                                        "data": data,
-                                        "start_datetime": start.isoformat(),
-                                        "end_datetime": end.isoformat()
-                                    }
-                                    st.rerun()
+                                search_next_available(data, lanes)
                             else:
-                                save_event(data)
-                                st.session_state.scheduled_successfully = True
-                                st.rerun()
+                                is_reserved, error_messages = save_event(data)
+                                if is_reserved:
+                                    st.session_state.scheduled_successfully = True
+                                    st.rerun()
+                                else:
+                                    error_message = "Resource conflict. The recurring event cannot be scheduled, because:"
+                                    for error in error_messages:
+                                        error_message += (f"\n + {error}")
+                                    st.error(error_message)
                            
 def schedule():
     st.title("Scheduled events")
-    events_data = load_json("events.json")
-    if len(events_data) == 0:
+    event_store = get_event_store()
+    if event_store.count() == 0:
         st.info("There are no scheduled events.")
     else:
-        for event in events_data:
-            if type(event) == str:
-                pass
-            else:
-                
-                with st.container(border=True):
-                    if event.get("subtype") == "Lock maintenance":
-                        st.write(f"{event.get("id")} - Lock maintenance :material/grid_view:")
-                        start_datetime, end_datetime = st.columns(2)
-                        with start_datetime:
-                            st.write(f"Start: {event.get("start_datetime")}")
-                        with end_datetime:
-                            st.write(f"End: {event.get("end_datetime")}")
-                        maintenance_teams, locks = st.columns(2)
-                        with maintenance_teams:
-                            st.write(f"Maintenance teams: {event.get("maintenance_teams")}")
-                        with locks:
-                            locks = ""
-                            for lock in event.get("locks"):
-                                locks += f"{lock}, "
-                            st.write(f"Locks: {locks[:-2]}")
-                    else:
-                        st.write(f"{event.get("id")} - {event.get("vessel_size")} vessel transit :material/sailing:")
-                        start_datetime, end_datetime = st.columns(2)
-                        with start_datetime:
-                            st.write(f"Start: {event.get("start_datetime")}")
-                        with end_datetime:
-                            st.write(f"End: {event.get("end_datetime")}")
-                        if event.get("vessel_size") == "Small":
-                            junior_pilots, tugboat, locks = st.columns(3)
-                            with junior_pilots:
-                                st.write(f"Junior pilots: {event.get("junior_pilots")}")
-                            with tugboat:
-                                st.write(f"Tugboats: {event.get("tugboat")}")
-                            with locks:
-                                locks = ""
-                                for lock in event.get("locks"):
-                                    locks += f"{lock}, "
-                                st.write(f"Locks: {locks[:-2]}")
-                        else:
-                            senior_pilots, tugboat, locks = st.columns(3)
-                            with senior_pilots:
-                                st.write(f"Senior pilots: {event.get("senior_pilots")}")
-                            with tugboat:
-                                st.write(f"Tugboats: {event.get("tugboat")}")
-                            with locks:
-                                locks = ""
-                                for lock in event.get("locks"):
-                                    locks += f"{lock}, "
-                                st.write(f"Locks: {locks[:-2]}")
-                    if st.button("Delete event", key=f"delete_{event.get("id")}"):
-                        delete_event(event.get("id"))
-                        st.rerun()
+        def reset_page():
+            st.session_state.schedule_page = 1
+
+        with st.expander(":material/filter_list: Filters", expanded=True):
+            from_column, to_column = st.columns(2)
+            with from_column:
+                from_date = st.date_input(":material/calendar_today: From", value=None, on_change=reset_page)
+            with to_column:
+                to_date = st.date_input(":material/calendar_today: To", value=None, on_change=reset_page)
+            subtype_column, vessel_size_column, lock_column = st.columns(3)
+            with subtype_column:
+                subtype = st.selectbox("Event", ["All", "Transit", "Lock maintenance"], on_change=reset_page)
+            with vessel_size_column:
+                vessel_size = st.selectbox("Vessel size", ["All", "Small", "Medium", "Large"], disabled=subtype == "Lock maintenance", on_change=reset_page)
+            with lock_column:
+                lock = st.selectbox("Lock", ["All"] + load_json("resources.json")["locks"], on_change=reset_page)
+        page_size = st.selectbox("Events per page", [25, 50, 100, 250], index=1, on_change=reset_page)
+
+        filters = {
+            "start_datetime": datetime.combine(from_date, time.min) if from_date else None,
+            "end_datetime": datetime.combine(to_date + timedelta(days=1), time.min) if to_date else None,
+            "lock": lock if lock != "All" else None,
+            "subtype": subtype if subtype != "All" else None,
+            "vessel_size": vessel_size if vessel_size != "All" and subtype != "Lock maintenance" else None
+        }
+        # Only the visible page is fetched and rendered on each rerun.
+        page = st.session_state.get("schedule_page", 1)
+        total, events_data = event_store.query(**filters, limit=page_size, offset=(page - 1) * page_size)
+        if total and not events_data:
+            page = st.session_state.schedule_page = 1
+            total, events_data = event_store.query(**filters, limit=page_size, offset=0)
+        if total == 0:
+            st.info("No scheduled events match these filters.")
+        else:
+            rows = []
+            for event in events_data:
+                rows.append({
+                    "ID": event.get("id"),
+                    "Event": "Lock maintenance" if event.get("subtype") == "Lock maintenance" else f"{event.get("vessel_size")} vessel transit",
+                    "Start": event.get("start_datetime").replace("T", " "),
+                    "End": event.get("end_datetime").replace("T", " "),
+                    "Junior pilots": event.get("junior_pilots"),
+                    "Senior pilots": event.get("senior_pilots"),
+                    "Tugboats": event.get("tugboats"),
+                    "Maintenance teams": event.get("maintenance_teams"),
+                    "Locks": ", ".join(event.get("locks") or [])
+                })
+            selection = st.dataframe(
+                rows,
+                hide_index=True,
+                use_container_width=True,
+                on_select="rerun",
+                selection_mode="multi-row",
+                key=f"schedule_table_{page}"
+            )
+            selected_ids = [rows[row]["ID"] for row in selection.selection.rows]
+            pages = -(-total // page_size)
+            first = (page - 1) * page_size + 1
+            st.caption(f"Showing events {first} to {first + len(rows) - 1} of {total}.")
+            page_column, delete_column = st.columns(2)
+            with page_column:
+                st.number_input("Page", min_value=1, max_value=pages, step=1, key="schedule_page")
+            with delete_column:
+                if st.button("Delete selected events", disabled=not selected_ids):
+                    for event_id in selected_ids:
+                        delete_event(event_id)
+                    st.rerun()
+
+def capacity():
+    st.title("Capacity")
+    st.write("Free resources and lock occupancy at every checkpoint of the next 60 days. Pick a slot where everything your event needs is still free.")
+    timeline = capacity_timeline()
+    labels = {
+        "junior_pilots": "Junior pilots",
+        "senior_pilots": "Senior pilots",
+        "tugboats": "Tugboats",
+        "maintenance_teams": "Maintenance teams"
+    }
+    series = st.selectbox(
+        "Show",
+        list(labels) + [f"Lock {lock}" for lock in timeline["locks"]],
+        format_func=lambda name: labels.get(name, name)
+    )
+    if series in timeline["free"]:
+        values = timeline["free"][series]
+        legend = "Free"
+    else:
+        values = (timeline["locks"][series.removeprefix("Lock ")] == 0).astype(int)
+        legend = "Lock free"
+    cells = []
+    for hour, value in enumerate(values.tolist()):
+        moment = timeline["origin"] + hour * timeline["step"]
+        cells.append({"Day": moment.strftime("%Y-%m-%d"), "Hour": moment.strftime("%H:%M"), legend: value})
+    heatmap = alt.Chart(alt.Data(values=cells)).mark_rect().encode(
+        x=alt.X("Hour:O"),
+        y=alt.Y("Day:O"),
+        color=alt.Color(f"{legend}:Q", scale=alt.Scale(scheme="redyellowgreen")),
+        tooltip=["Day:O", "Hour:O", f"{legend}:Q"]
+    )
+    st.altair_chart(heatmap, use_container_width=True)
+    st.subheader("Free resources over time")
+    chart_data = {"Time": [timeline["origin"] + hour * timeline["step"] for hour in range(timeline["hours"])]}
+    chart_data.update({labels[resource]: free.tolist() for resource, free in timeline["free"].items()})
+    st.line_chart(chart_data, x="Time")
+
+def diagnostics():
+    st.title("Diagnostics")
+    instrumentation_column, profiling_column = st.columns(2)
+    with instrumentation_column:
+        instrumentation = st.toggle("Collect scheduler metrics", value=metrics.enabled)
+    with profiling_column:
+        profiling = st.toggle("Capture cProfile of each page run", value=metrics.profiling)
+    if instrumentation and not metrics.enabled:
+        metrics.enable()
+    elif not instrumentation and metrics.enabled:
+        metrics.disable()
+    metrics.set_profiling(profiling)
+    report = metrics.dump()
+    if not report["timings"] and not report["counters"]:
+        st.info("No metrics collected yet. Turn on collection and schedule some events.")
+    else:
+        st.subheader("Timings")
+        st.dataframe(
+            [{"Method": name, "Calls": timing["calls"], "Mean (ms)": round(timing["mean_ms"], 3), "Max (ms)": round(timing["max_ms"], 3), "Total (ms)": round(timing["total_ms"], 1)} for name, timing in report["timings"].items()],
+            hide_index=True,
+            use_container_width=True
+        )
+        st.subheader("Counters")
+        st.dataframe([{"Counter": name, "Value": value} for name, value in sorted(report["counters"].items())], hide_index=True, use_container_width=True)
+    st.subheader("Availability cache")
+    cache_stats = availability_cache.stats()
+    st.caption("Window checks reused until the next save or delete.")
+    entries_column, hit_rate_column, evictions_column, invalidations_column = st.columns(4)
+    entries_column.metric("Entries", f"{cache_stats['entries']} / {cache_stats['size']}")
+    hit_rate_column.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}", help=f"{cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    evictions_column.metric("Evictions", cache_stats["evictions"])
+    invalidations_column.metric("Invalidations", cache_stats["invalidations"])
+    if report["profile"]:
+        with st.expander("cProfile, sorted by cumulative time"):
+            st.code(report["profile"])
+    download, reset = st.columns(2)
+    with download:
+        st.download_button("Download metrics", json.dumps(report, indent=4), file_name="metrics.json", mime="application/json")
+    with reset:
+        if st.button("Reset metrics"):
+            metrics.reset()
+            st.rerun()
 
 pg_home = st.Page(home, title="Home page", icon=":material/home:")
 pg_add = st.Page(add, title="Add events", icon=":material/add:")
 pg_schedule = st.Page(schedule, title="Scheduled events", icon=":material/list:")
+pg_capacity = st.Page(capacity, title="Capacity", icon=":material/calendar_view_month:")
+pg_diagnostics = st.Page(diagnostics, title="Diagnostics", icon=":material/monitoring:")
+
+pg = st.navigation({"": [pg_home, pg_add, pg_schedule, pg_capacity, pg_diagnostics]})
 
-pg = st.navigation({"": [pg_home, pg_add, pg_schedule]})
+# Events that are over move to the monthly archive, at most once an hour.
+maintain_horizon()
 
-pg.run()
+with metrics.profiled():
+    pg.run()
@@ -0,0 +1,99 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from storage import get_event_store
+
+ARCHIVE_DIRECTORY = "archive"
+ARCHIVE_INTERVAL = timedelta(hours=1)
+
+archive_lock = threading.Lock()
+last_run = None
+
+def partition_path(directory, month):
+    return Path(directory) / f"events-{month}.jsonl.gz"
+
+def partition_months(directory=ARCHIVE_DIRECTORY):
+    return sorted(path.name[len("events-"):-len(".jsonl.gz")] for path in Path(directory).glob("events-*.jsonl.gz"))
+
+def write_partitions(events_data, directory=ARCHIVE_DIRECTORY):
+    # Events are filed under the month they start in. Every run appends one more
+    # gzip member to the month's file, and gzip reads the members back as one stream.
+    months = {}
+    for event_data in events_data:
+        months.setdefault(event_data["start_datetime"][:7], []).append(event_data)
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for month, month_events in sorted(months.items()):
+        with open(partition_path(directory, month), "ab") as file:
+            with gzip.GzipFile(fileobj=file, mode="wb") as compressed:
+                compressed.write("".join(json.dumps(event_data) + "\n" for event_data in month_events).encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+
+def archive_past_events(before=None, directory=ARCHIVE_DIRECTORY):
+    before = before if before is not None else datetime.now()
+    with archive_lock:
+        return len(get_event_store().delete_ended(before, lambda events_data: write_partitions(events_data, directory)))
+
+def maintain_horizon(directory=ARCHIVE_DIRECTORY, interval=ARCHIVE_INTERVAL):
+    # Cheap enough to call on every page run: archives at most once per interval.
+    global last_run
+    now = datetime.now()
+    with archive_lock:
+        if last_run is not None and now - last_run < interval:
+            return 0
+        last_run = now
+    return archive_past_events(now, directory)
+
+def query_archive(start_datetime=None, end_datetime=None, lock=None, subtype=None, vessel_size=None, directory=ARCHIVE_DIRECTORY):
+    # Streams matching events partition by partition, oldest month first, and
+    # only opens the months that can hold them. An event may start in the month
+    # before the range, so that one is read too.
+    start = start_datetime.isoformat() if start_datetime is not None else None
+    end = end_datetime.isoformat() if end_datetime is not None else None
+    first_month = (start_datetime.replace(day=1) - timedelta(days=1)).strftime("%Y-%m") if start_datetime is not None else None
+    for month in partition_months(directory):
+        if (first_month is not None and month < first_month) or (end is not None and month > end[:7]):
+            continue
+        # A run interrupted before the store committed leaves events that the next
+        # run archives again, so each partition skips ids it has already yielded.
+        seen = set()
+        with gzip.open(partition_path(directory, month), "rt", encoding="utf-8") as partition:
+            for line in partition:
+                event = json.loads(line)
+                if event["id"] in seen:
+                    continue
+                seen.add(event["id"])
+                if (
+                    (start is None or event["end_datetime"] > start)
+                    and (end is None or event["start_datetime"] < end)
+                    and (lock is None or lock in event["locks"])
+                    and (subtype is None or event["subtype"] == subtype)
+                    and (vessel_size is None or event["vessel_size"] == vessel_size)
+                ):
+                    yield event
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Move events that are over into the monthly archive, or stream archived events.")
+    parser.add_argument("--directory", default=ARCHIVE_DIRECTORY)
+    parser.add_argument("--before", type=datetime.fromisoformat, help="Archive events ending at or before this time (default: now).")
+    parser.add_argument("--query", action="store_true", help="Write archived events as JSON lines to stdout instead of archiving.")
+    parser.add_argument("--from", dest="start_datetime", type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="end_datetime", type=datetime.fromisoformat)
+    parser.add_argument("--lock")
+    parser.add_argument("--subtype")
+    parser.add_argument("--vessel-size")
+    arguments = parser.parse_args(arguments)
+    if arguments.query:
+        for event in query_archive(arguments.start_datetime, arguments.end_datetime, arguments.lock, arguments.subtype, arguments.vessel_size, arguments.directory):
+            sys.stdout.write(json.dumps(event) + "\n")
+        return
+    archived = archive_past_events(arguments.before, arguments.directory)
+    print(f"Archived {archived} events into {arguments.directory}/")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+import scheduler
+import storage
+
+SIZES = [100, 1000, 10000, 100000]
+HORIZON_HOURS = 58 * 24
+KINDS = [
+    ("Transit", "Small", 3),
+    ("Transit", "Medium", 3),
+    ("Transit", "Large", 2),
+    ("Lock maintenance", None, 2)
+]
+
+def random_event(generator, origin, event_type="One-time event"):
+    subtype, vessel_size, weight = generator.choices(KINDS, weights=[kind[2] for kind in KINDS])[0]
+    rule = scheduler.rule_for(subtype, vessel_size)
+    start = origin + timedelta(hours=generator.randrange(HORIZON_HOURS))
+    duration = timedelta(hours=generator.randint(int(rule.min_duration_hours), int(rule.max_duration_hours)))
+    event_data = {
+        "type": event_type,
+        "start_datetime": start.isoformat(),
+        "end_datetime": (start + duration).isoformat(),
+        "repeats": None,
+        "interval": None,
+        "subtype": subtype,
+        "vessel_size": vessel_size,
+        "locks": list(generator.choice(rule.lane_list))
+    }
+    event_data.update(rule.requirements)
+    return event_data
+
+def generate_schedule(count, seed=0, origin=None, recurring_share=0.1):
+    # A mix of transits of every size, lock maintenance and recurring series,
+    # in the same shape the store and the old events.json keep them.
+    scheduler.refresh_config()
+    generator = random.Random(seed)
+    origin = origin or datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    events_data = []
+    while len(events_data) < count:
+        if generator.random() < recurring_share:
+            data = random_event(generator, origin, "Recurring event")
+            data["interval"] = generator.randint(1, 7)
+            data["repeats"] = generator.randint(2, 6)
+            series = scheduler.expand_event(data)
+            events_data.extend(series[:count - len(events_data)])
+        else:
+            events_data.append(random_event(generator, origin))
+    for event_id, event_data in enumerate(events_data, start=1):
+        event_data["id"] = str(event_id)
+    return events_data
+
+def generate_requests(count, seed=1, origin=None):
+    scheduler.refresh_config()
+    generator = random.Random(seed)
+    origin = origin or datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    one_time = [random_event(generator, origin) for i in range(count)]
+    recurring = []
+    while len(recurring) < count:
+        data = random_event(generator, origin, "Recurring event")
+        data["interval"] = generator.randint(1, 7)
+        data["repeats"] = generator.randint(2, 6)
+        if scheduler.Event(data).validate_recurrence_limits():
+            recurring.append(data)
+    return one_time, recurring
+
+def use_store(filename):
+    storage.event_store = storage.open_event_store(filename)
+    scheduler.occupancy_index = None
+    scheduler.occupancy_version = None
+    scheduler.capacity_cache = None
+    scheduler.availability_cache = scheduler.AvailabilityCache()
+    return storage.event_store
+
+def measure(function, requests_data):
+    timings = []
+    for data in requests_data:
+        event = scheduler.Event(data)
+        started = time.perf_counter()
+        function(event)
+        timings.append((time.perf_counter() - started) * 1000)
+    # Memory is traced in a second pass so tracemalloc does not skew the timings.
+    tracemalloc.start()
+    for data in requests_data[:10]:
+        function(scheduler.Event(data))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "calls": len(timings),
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": statistics.median(timings),
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else max(timings),
+        "max_ms": max(timings),
+        "peak_memory_bytes": peak
+    }
+
+PATHS = {
+    "validate_resources_availability": ("one_time", lambda event: event.validate_resources_availability()),
+    "validate_recurrences": ("recurring", lambda event: event.validate_recurrences()),
+    "one_time_event_next_available_datetime": ("one_time", lambda event: event.one_time_event_next_available_datetime()),
+    "recurring_event_next_available_datetime": ("recurring", lambda event: event.recurring_event_next_available_datetime())
+}
+
+def run_size(count, requests, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        event_store = use_store(str(Path(directory) / "events.db"))
+        event_store.insert_many(generate_schedule(count, seed))
+        tracemalloc.start()
+        started = time.perf_counter()
+        scheduler.get_occupancy_index()
+        index_seconds = time.perf_counter() - started
+        index_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        one_time, recurring = generate_requests(requests, seed + 1)
+        result = {"events": count, "index_build_s": index_seconds, "index_memory_bytes": index_memory, "paths": {}}
+        for name, (workload, function) in PATHS.items():
+            result["paths"][name] = measure(function, one_time if workload == "one_time" else recurring)
+        result["availability_cache"] = scheduler.availability_cache.stats()
+        event_store.connection.close()
+    return result
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Time the validation and search paths against synthetic schedules.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Schedule sizes to benchmark.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests timed per path and size.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Where to write the JSON results.")
+    parser.add_argument("--generate", type=int, metavar="COUNT", help="Only write a synthetic events.json schedule of COUNT events to --output.")
+    arguments = parser.parse_args(arguments)
+    if arguments.generate:
+        events_data = generate_schedule(arguments.generate, arguments.seed)
+        Path(arguments.output).write_text(json.dumps(events_data + [str(len(events_data) + 1)], indent=4))
+        return
+    results = {
+        "started": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "requests": arguments.requests,
+        "seed": arguments.seed,
+        "sizes": []
+    }
+    for count in arguments.sizes:
+        result = run_size(count, arguments.requests, arguments.seed)
+        results["sizes"].append(result)
+        summary = ", ".join(f"{name} {path['mean_ms']:.2f}ms" for name, path in result["paths"].items())
+        print(f"{count} events: index {result['index_build_s']:.2f}s, {result['index_memory_bytes'] / 1e6:.1f} MB; {summary}")
+    Path(arguments.output).write_text(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import json
+import sys
+from datetime import datetime
+from itertools import count
+import metrics
+from optimizer import optimize_batch
+from parallel import find_available_series
+import scheduler
+from scheduler import Event, expand_event, reservation_lock
+from storage import VersionConflict, get_event_store
+
+def check_request(data, workers=None):
+    # One malformed line (unknown sizes, missing fields) is rejected on its own
+    # instead of ending the whole stream.
+    try:
+        return evaluate_request(data, workers)
+    except (AttributeError, KeyError, TypeError, ValueError) as error:
+        return "rejected", [f"Malformed event: {error}"], None
+
+def evaluate_request(data, workers=None):
+    event = Event(data)
+    if scheduler.rule_for(event.subtype, getattr(event, "vessel_size", None)) is None:
+        return "rejected", [f"There are no restrictions for a {event.subtype} event."], None
+    lanes = None
+    if not event.locks and event.subtype in ("Transit", "Lock maintenance"):
+        # No locks requested: take whichever lane is free, and search every lane.
+        lanes = event.lane_options()
+        event.locks = event.assign_lane() or list(lanes[0])
+        data["locks"] = event.locks
+    if event.type == "Recurring event":
+        if not event.static_validations_recurrences():
+            return "rejected", event.error_messages, None
+        is_valid, error_messages = event.validate_recurrences()
+        if is_valid:
+            return "accepted", [], None
+        if workers:
+            slots = find_available_series(event, event.start_datetime + scheduler.CHECKPOINT_STEP, lanes, workers)
+        else:
+            slots = event.find_available_series(event.start_datetime + scheduler.CHECKPOINT_STEP, lanes=lanes)
+    else:
+        if not event.static_validations():
+            return "rejected", event.error_messages, None
+        is_valid, error_messages = event.validate_resources_availability()
+        if is_valid:
+            return "accepted", [], None
+        slots = event.find_available_slots(event.start_datetime + scheduler.CHECKPOINT_STEP, lanes=lanes)
+    if not slots:
+        return "rejected", list(event.error_messages) + ["No available datetime found in the next 60 days"], None
+    return "suggested", list(event.error_messages), slots[0]
+
+staged_ids = count(1)
+
+def stage(data, index):
+    events_data = expand_event(data)
+    for event_data in events_data:
+        # Negative ids can never clash with the ones the store hands out.
+        event_data["id"] = -next(staged_ids)
+        index.add(event_data)
+    return events_data
+
+def flush(pending, version):
+    index = scheduler.get_occupancy_index()
+    events_data = []
+    for result, data, staged in pending:
+        for event_data in staged:
+            index.remove(event_data["id"])
+            events_data.append(event_data)
+    try:
+        event_ids = iter(scheduler.commit_events(events_data, version))
+        for result, data, staged in pending:
+            result["ids"] = [next(event_ids) for event_data in staged]
+    except VersionConflict:
+        # Another process wrote in between, so the staged batch was checked against
+        # a stale schedule; book each request on its own against the fresh one.
+        for result, data, staged in pending:
+            is_reserved, error_messages, ids = scheduler.reserve_event(data)
+            if is_reserved:
+                result["ids"] = ids
+            else:
+                result["status"] = "rejected"
+                result["errors"] = error_messages
+    return get_event_store().version()
+
+def schedule_jsonl(lines, batch_size=500, accept_suggestions=False, workers=None):
+    with reservation_lock:
+        version = get_event_store().version()
+        index = scheduler.get_occupancy_index()
+        results = []
+        pending = []
+        try:
+            for line_number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                result = {"line": line_number}
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as error:
+                    result.update({"status": "rejected", "errors": [f"Invalid JSON: {error}"]})
+                    results.append(result)
+                    continue
+                if not isinstance(data, dict):
+                    result.update({"status": "rejected", "errors": ["Each line has to be a JSON object."]})
+                    results.append(result)
+                    continue
+                if "request_id" in data:
+                    result["request_id"] = data["request_id"]
+                status, error_messages, slot = check_request(data, workers)
+                result["status"] = status
+                if error_messages:
+                    result["errors"] = error_messages
+                if slot is not None:
+                    result["start_datetime"] = slot[0].isoformat()
+                    result["end_datetime"] = slot[1].isoformat()
+                    result["locks"] = slot[2]
+                    if accept_suggestions:
+                        data = dict(data, start_datetime=result["start_datetime"], end_datetime=result["end_datetime"], locks=slot[2])
+                        status = result["status"] = "accepted"
+                if status == "accepted":
+                    pending.append((result, data, stage(data, index)))
+                results.append(result)
+                if len(pending) >= batch_size:
+                    version = flush(pending, version)
+                    pending = []
+                    yield from results
+                    results = []
+            if pending:
+                flush(pending, version)
+                pending = []
+            yield from results
+        finally:
+            # Leave no staged placeholders behind if the run stops half way.
+            for result, data, staged in pending:
+                for event_data in staged:
+                    index.remove(event_data["id"])
+
+def optimize_jsonl(lines, objective="throughput", time_limit=2.0):
+    with reservation_lock:
+        version = get_event_store().version()
+        index = scheduler.get_occupancy_index()
+        results = []
+        requests_data = []
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            result = {"line": line_number}
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as error:
+                result.update({"status": "rejected", "errors": [f"Invalid JSON: {error}"]})
+                results.append(result)
+                continue
+            if not isinstance(data, dict):
+                result.update({"status": "rejected", "errors": ["Each line has to be a JSON object."]})
+                results.append(result)
+                continue
+            if "request_id" in data:
+                result["request_id"] = data["request_id"]
+            results.append(result)
+            requests_data.append((result, data))
+        pending = []
+        for (result, data), optimized in zip(requests_data, optimize_batch([data for result, data in requests_data], objective, time_limit)):
+            optimized.pop("position")
+            result.update(optimized)
+            if result["status"] == "scheduled":
+                result["status"] = "accepted"
+                data = dict(data, start_datetime=result["start_datetime"], end_datetime=result["end_datetime"], locks=result["locks"])
+                pending.append((result, data, stage(data, index)))
+        if pending:
+            flush(pending, version)
+        return results
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Schedule a JSONL batch of events without starting Streamlit.")
+    parser.add_argument("input", help="JSONL file with one event per line, or - for standard input.")
+    parser.add_argument("-o", "--output", help="Where to write the JSONL results (standard output by default).")
+    parser.add_argument("--batch-size", type=int, default=500, help="How many accepted events to commit at once.")
+    parser.add_argument("--accept-suggestions", action="store_true", help="Book rejected events at their suggested time.")
+    parser.add_argument("--optimize", choices=["throughput", "delay"], help="Pack the whole batch at once, maximising scheduled transits or minimising total delay.")
+    parser.add_argument("--time-limit", type=float, default=2.0, help="Seconds the optimizer may spend improving the packing.")
+    parser.add_argument("--workers", type=int, help="Search recurring series across this many processes.")
+    parser.add_argument("--metrics", help="Write scheduler timings and counters for the run to this JSON file.")
+    parser.add_argument("--profile", action="store_true", help="Include a cProfile of the run in the --metrics file.")
+    arguments = parser.parse_args(arguments)
+    if arguments.metrics:
+        metrics.enable()
+        metrics.set_profiling(arguments.profile)
+    input_file = sys.stdin if arguments.input == "-" else open(arguments.input, encoding="utf-8")
+    output_file = sys.stdout if arguments.output is None else open(arguments.output, "w", encoding="utf-8")
+    started = datetime.now()
+    counts = {}
+    try:
+        with metrics.profiled():
+            if arguments.optimize:
+                results = optimize_jsonl(input_file, arguments.optimize, arguments.time_limit)
+            else:
+                results = schedule_jsonl(input_file, arguments.batch_size, arguments.accept_suggestions, arguments.workers)
+            for result in results:
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                output_file.write(json.dumps(result) + "\n")
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    if arguments.metrics:
+        metrics.write(arguments.metrics)
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"Processed {sum(counts.values())} requests in {(datetime.now() - started).total_seconds():.2f}s: {summary or 'nothing to do'}.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
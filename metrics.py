@@ -0,0 +1,142 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+# Hot loops guard every counter with `if metrics.enabled`, and timing wrappers are
+# only installed by enable(), so the disabled mode costs one attribute lookup.
+enabled = False
+profiling = False
+counters = {}
+timings = {}
+profile_stats = None
+profile_lock = threading.Lock()
+instrumented = []
+
+BUCKETS_MS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000]
+
+EVENT_METHODS = [
+    "static_validations",
+    "static_validations_recurrences",
+    "validate_resources_availability",
+    "validate_recurrences",
+    "conflicts",
+    "next_release",
+    "search_slots",
+    "assign_lane",
+    "one_time_event_next_available_datetime",
+    "recurring_event_next_available_datetime"
+]
+INDEX_METHODS = ["overlapping", "overlapping_many", "sweep"]
+SCHEDULER_FUNCTIONS = ["get_occupancy_index", "reserve_event", "commit_events", "remove_event", "refresh_config"]
+
+def count(name, amount=1):
+    counters[name] = counters.get(name, 0) + amount
+
+def record(name, milliseconds):
+    timing = timings.get(name)
+    if timing is None:
+        timing = timings[name] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1)}
+    timing["calls"] += 1
+    timing["total_ms"] += milliseconds
+    timing["max_ms"] = max(timing["max_ms"], milliseconds)
+    timing["buckets"][bisect_left(BUCKETS_MS, milliseconds)] += 1
+
+def timed(function, name):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, (time.perf_counter() - started) * 1000)
+    return wrapper
+
+def instrument(owner, names, prefix):
+    for name in names:
+        original = getattr(owner, name)
+        instrumented.append((owner, name, original))
+        setattr(owner, name, timed(original, f"{prefix}.{name}"))
+
+def enable():
+    global enabled
+    if enabled:
+        return
+    import scheduler
+    instrument(scheduler.Event, EVENT_METHODS, "Event")
+    instrument(scheduler.OccupancyIndex, INDEX_METHODS, "OccupancyIndex")
+    instrument(scheduler, SCHEDULER_FUNCTIONS, "scheduler")
+    enabled = True
+
+def disable():
+    global enabled
+    while instrumented:
+        owner, name, original = instrumented.pop()
+        setattr(owner, name, original)
+    enabled = False
+
+def reset():
+    global profile_stats
+    counters.clear()
+    timings.clear()
+    profile_stats = None
+
+def set_profiling(active):
+    global profiling
+    profiling = active
+
+@contextmanager
+def profiled():
+    # Only one cProfile can run at a time, so concurrent sessions skip the capture.
+    global profile_stats
+    if not profiling or not profile_lock.acquire(blocking=False):
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            if profile_stats is None:
+                profile_stats = pstats.Stats(profile)
+            else:
+                profile_stats.add(profile)
+    finally:
+        profile_lock.release()
+
+def profile_report(limit=30):
+    if profile_stats is None:
+        return None
+    output = io.StringIO()
+    profile_stats.stream = output
+    profile_stats.sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+def dump():
+    labels = [f"<={bucket}ms" for bucket in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+    return {
+        "enabled": enabled,
+        "counters": dict(counters),
+        "timings": {
+            name: {
+                "calls": timing["calls"],
+                "total_ms": timing["total_ms"],
+                "mean_ms": timing["total_ms"] / timing["calls"],
+                "max_ms": timing["max_ms"],
+                "histogram": dict(zip(labels, timing["buckets"]))
+            }
+            for name, timing in sorted(timings.items())
+        },
+        "profile": profile_report()
+    }
+
+def write(filename):
+    Path(filename).write_text(json.dumps(dump(), indent=4))
@@ -0,0 +1,176 @@
+import random
+import time
+from datetime import datetime, timedelta
+import scheduler
+from scheduler import RESOURCES, Event, first_checkpoint, next_checkpoint
+
+HORIZON = timedelta(days=60)
+
+class Timeline:
+    def __init__(self, origin, hours):
+        self.origin = origin
+        self.hours = hours
+        self.usage = {resource: [0] * hours for resource in RESOURCES}
+        self.locks = {lock: [0] * hours for lock in scheduler.resources_data["locks"]}
+
+    def slots(self, start_datetime, end_datetime):
+        first = max(0, -((self.origin - start_datetime) // scheduler.CHECKPOINT_STEP))
+        last = min(self.hours, -((self.origin - end_datetime) // scheduler.CHECKPOINT_STEP))
+        return range(first, last)
+
+    def add_event(self, event):
+        for hour in self.slots(event["start_datetime"], event["end_datetime"]):
+            for resource in RESOURCES:
+                self.usage[resource][hour] += event[resource]
+            for lock in event["locks"]:
+                if lock in self.locks:
+                    self.locks[lock][hour] += 1
+
+    def last_conflict(self, start, duration, demand, lane):
+        for hour in range(start + duration - 1, start - 1, -1):
+            for resource in RESOURCES:
+                if demand[resource] and self.usage[resource][hour] + demand[resource] > scheduler.resources_data[resource]:
+                    return hour
+            for lock in lane:
+                if self.locks[lock][hour]:
+                    return hour
+        return None
+
+    def place(self, start, duration, demand, lane, sign=1):
+        for hour in range(start, start + duration):
+            for resource in RESOURCES:
+                self.usage[resource][hour] += sign * demand[resource]
+            for lock in lane:
+                self.locks[lock][hour] += sign
+
+    def earliest_fit(self, request):
+        start = request["release"]
+        while start + request["duration"] <= self.hours:
+            next_start = None
+            for lane in request["lanes"]:
+                conflict = self.last_conflict(start, request["duration"], request["demand"], lane)
+                if conflict is None:
+                    return start, lane
+                if next_start is None or conflict + 1 < next_start:
+                    next_start = conflict + 1
+            start = next_start
+        return None
+
+def build_request(position, data, origin):
+    # Same as bulk.check_request: a malformed line is rejected on its own and the
+    # rest of the batch is still packed.
+    try:
+        return plan_request(position, data, origin)
+    except (AttributeError, KeyError, TypeError, ValueError) as error:
+        return None, [f"Malformed event: {error}"]
+
+def plan_request(position, data, origin):
+    event = Event(data)
+    if event.type == "Recurring event":
+        return None, ["Recurring events cannot be packed by the optimizer, schedule them on their own."]
+    if not (event.validate_duration_restrictions() and event.validate_resources_logic()):
+        return None, event.error_messages
+    rule = scheduler.rule_for(event.subtype, getattr(event, "vessel_size", None))
+    if rule is None:
+        return None, [f"There are no restrictions for a {event.subtype} event."]
+    # The timeline packs the rule's demand, so a request asking for anything else
+    # would be committed with resources the packing never accounted for.
+    error_messages = [rule.requirement_errors[resource] for resource, required in rule.requirements if getattr(event, resource) != required]
+    if error_messages:
+        return None, error_messages
+    if event.subtype == "Lock maintenance" and event.locks in rule.lane_list:
+        lanes = [event.locks]
+    else:
+        lanes = rule.lane_list
+    requested = first_checkpoint(origin, max(event.start_datetime, origin), scheduler.CHECKPOINT_STEP)
+    return {
+        "position": position,
+        "data": data,
+        "release": (requested - origin) // scheduler.CHECKPOINT_STEP,
+        "duration": -((event.start_datetime - event.end_datetime) // scheduler.CHECKPOINT_STEP),
+        "demand": dict(rule.requirements),
+        "lanes": lanes
+    }, []
+
+def score(requests, assignment, objective, hours):
+    delay = sum(assignment[request["position"]][0] - request["release"] for request in requests if request["position"] in assignment)
+    unscheduled = len(requests) - len(assignment)
+    if objective == "delay":
+        return (delay + unscheduled * hours, unscheduled)
+    return (unscheduled, delay)
+
+def optimize_batch(requests_data, objective="throughput", time_limit=2.0, seed=0):
+    started = time.perf_counter()
+    now = datetime.now()
+    origin = next_checkpoint(now)
+    hours = (now + HORIZON - origin) // scheduler.CHECKPOINT_STEP
+    timeline = Timeline(origin, hours)
+    with scheduler.index_lock:
+        index = scheduler.get_occupancy_index()
+        for position in index.overlapping(origin, origin + hours * scheduler.CHECKPOINT_STEP):
+            timeline.add_event(index.event(position))
+    results = [{"position": position} for position in range(len(requests_data))]
+    requests = []
+    for position, data in enumerate(requests_data):
+        request, error_messages = build_request(position, data, origin)
+        if request is None:
+            results[position].update({"status": "rejected", "errors": error_messages})
+        else:
+            requests.append(request)
+    # List scheduling: earliest release first, and the most demanding request first on ties.
+    requests.sort(key=lambda request: (request["release"], -request["duration"], -sum(request["demand"].values())))
+    assignment = {}
+    for request in requests:
+        fit = timeline.earliest_fit(request)
+        if fit is not None:
+            assignment[request["position"]] = fit
+            timeline.place(fit[0], request["duration"], request["demand"], fit[1])
+    # Local search: ruin a few requests and recreate them in a random order, keeping
+    # the result whenever it is at least as good as the incumbent.
+    generator = random.Random(seed)
+    current = score(requests, assignment, objective, hours)
+    while requests and time.perf_counter() - started < time_limit:
+        ruined = generator.sample(requests, min(len(requests), 4))
+        unscheduled = [request for request in requests if request["position"] not in assignment and request not in ruined]
+        previous = {request["position"]: assignment.pop(request["position"]) for request in ruined if request["position"] in assignment}
+        for request in ruined:
+            if request["position"] in previous:
+                start, lane = previous[request["position"]]
+                timeline.place(start, request["duration"], request["demand"], lane, -1)
+        generator.shuffle(ruined)
+        placed = []
+        for request in ruined + unscheduled:
+            fit = timeline.earliest_fit(request)
+            if fit is not None:
+                assignment[request["position"]] = fit
+                timeline.place(fit[0], request["duration"], request["demand"], fit[1])
+                placed.append(request)
+        candidate = score(requests, assignment, objective, hours)
+        if candidate <= current:
+            current = candidate
+            continue
+        for request in placed:
+            start, lane = assignment.pop(request["position"])
+            timeline.place(start, request["duration"], request["demand"], lane, -1)
+        for request in ruined:
+            if request["position"] in previous:
+                start, lane = assignment[request["position"]] = previous[request["position"]]
+                timeline.place(start, request["duration"], request["demand"], lane)
+    for request in requests:
+        result = results[request["position"]]
+        if request["position"] in assignment:
+            start, lane = assignment[request["position"]]
+            start_datetime = origin + start * scheduler.CHECKPOINT_STEP
+            placed = {
+                "start_datetime": start_datetime.isoformat(),
+                "end_datetime": (start_datetime + request["duration"] * scheduler.CHECKPOINT_STEP).isoformat(),
+                "locks": list(lane)
+            }
+            event = Event(dict(request["data"], **placed))
+            if not event.static_validations():
+                result.update({"status": "rejected", "errors": event.error_messages})
+                continue
+            result.update({"status": "scheduled", **placed, "delay_hours": (start - request["release"]) * scheduler.CHECKPOINT_STEP / timedelta(hours=1)})
+        else:
+            result.update({"status": "unscheduled", "errors": ["No start time and lane within the next 60 days fit this request."]})
+    return results
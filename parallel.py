@@ -0,0 +1,215 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+import scheduler
+from scheduler import RESOURCES, OccupancyIndex
+
+# Below these sizes a process pool costs more than the search it would split.
+PARALLEL_MIN_EVENTS = 2000
+PARALLEL_MIN_CANDIDATES = 96
+CHUNKS_PER_WORKER = 4
+NO_CHUNK = 2 ** 62
+
+pool = None
+pool_workers = None
+control = None
+control_view = None
+snapshot = None
+searches = 0
+pool_lock = threading.Lock()
+
+class Snapshot:
+    # The index columns copied once into a shared memory block, so every worker
+    # searches the same read-only schedule without pickling it per task.
+    def __init__(self, index):
+        self.key = (id(index), index.changes)
+        self.max_duration = index.max_duration
+        columns = index.columns()
+        self.layout = []
+        offset = 0
+        for column in columns:
+            self.layout.append((column.typecode, offset, len(column) * column.itemsize))
+            offset += len(column) * column.itemsize
+        self.memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for column, (typecode, offset, size) in zip(columns, self.layout):
+            self.memory.buf[offset:offset + size] = column.tobytes()
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+def get_pool(workers):
+    # control holds the id of the running search and the earliest chunk known to
+    # hold a slot; workers poll it to abandon chunks that can no longer win.
+    global pool, pool_workers, control, control_view
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if control is None:
+            control = shared_memory.SharedMemory(create=True, size=16)
+            control_view = control.buf.cast("q")
+        # Spawned workers do not inherit the server's threads or locks.
+        pool = ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"), initializer=start_worker, initargs=(control.name,))
+        pool_workers = workers
+    return pool
+
+def get_snapshot(index):
+    global snapshot
+    if snapshot is None or snapshot.key != (id(index), index.changes):
+        if snapshot is not None:
+            snapshot.release()
+        snapshot = Snapshot(index)
+    return snapshot
+
+worker_shared_control = None
+worker_control = None
+worker_memory = None
+
+def start_worker(control_name):
+    global worker_shared_control, worker_control
+    worker_shared_control = shared_memory.SharedMemory(control_name)
+    worker_control = worker_shared_control.buf.cast("q")
+
+def attach(task):
+    global worker_memory
+    if worker_memory is None or worker_memory.name != task["snapshot"]:
+        scheduler.pinned_index = None
+        worker_memory = shared_memory.SharedMemory(task["snapshot"])
+        buffer = worker_memory.buf
+        index = OccupancyIndex()
+        index.set_columns([buffer[offset:offset + size].cast(typecode) for typecode, offset, size in task["layout"]], task["max_duration"])
+        scheduler.pinned_index = index
+    # Bits and kind codes are handed out in first-seen order, so use the parent's.
+    scheduler.lock_bits.clear()
+    scheduler.lock_bits.update(task["lock_bits"])
+    scheduler.event_kinds[:] = task["event_kinds"]
+    scheduler.resources_data = task["resources"]
+    scheduler.CHECKPOINT_STEP = task["step"]
+
+def search_chunk(task):
+    # Event() re-reads the worker's own config files, so the parent's is attached after it.
+    event = scheduler.Event(task["event"])
+    attach(task)
+    search_id, chunk = task["search_id"], task["chunk"]
+    def cancelled():
+        return worker_control[0] != search_id or worker_control[1] < chunk
+    slots = event.search_slots(task["offsets"], task["start"], 1, task["lanes"], task["end"], cancelled)
+    return slots[0] if slots else None
+
+def event_data(event):
+    data = {
+        "type": event.type,
+        "start_datetime": event.start_datetime.isoformat(),
+        "end_datetime": event.end_datetime.isoformat(),
+        "repeats": getattr(event, "repeats", None),
+        "interval": getattr(event, "interval", None),
+        "subtype": event.subtype,
+        "vessel_size": getattr(event, "vessel_size", None),
+        "locks": event.locks
+    }
+    data.update({resource: getattr(event, resource) for resource in RESOURCES})
+    return data
+
+def search_slots(event, offsets, earliest_start=None, lanes=None, workers=None):
+    # Splits the candidate start times into chunks searched side by side; the
+    # earliest chunk holding a slot wins and later chunks are told to stop.
+    global pool, searches
+    workers = workers or os.cpu_count() or 1
+    earliest_start = earliest_start if earliest_start is not None else event.start_datetime
+    duration = event.end_datetime - event.start_datetime
+    latest_start = datetime.now() + timedelta(days=60) - offsets[-1] - duration
+    candidates = (latest_start - earliest_start) // scheduler.CHECKPOINT_STEP + 1
+    index = scheduler.get_occupancy_index()
+    if workers < 2 or len(index) < PARALLEL_MIN_EVENTS or candidates < PARALLEL_MIN_CANDIDATES:
+        return event.search_slots(offsets, earliest_start, 1, lanes)
+    with pool_lock:
+        try:
+            executor = get_pool(workers)
+            with scheduler.index_lock:
+                shared = get_snapshot(index)
+        except OSError:
+            return event.search_slots(offsets, earliest_start, 1, lanes)
+        searches += 1
+        search_id = searches
+        control_view[0] = search_id
+        control_view[1] = NO_CHUNK
+        chunk_length = -(-candidates // (workers * CHUNKS_PER_WORKER)) * scheduler.CHECKPOINT_STEP
+        futures = []
+        chunk_start = earliest_start
+        while chunk_start <= latest_start:
+            task = {
+                "snapshot": shared.memory.name,
+                "layout": shared.layout,
+                "max_duration": shared.max_duration,
+                "lock_bits": dict(scheduler.lock_bits),
+                "event_kinds": list(scheduler.event_kinds),
+                "resources": scheduler.resources_data,
+                "step": scheduler.CHECKPOINT_STEP,
+                "search_id": search_id,
+                "chunk": len(futures),
+                "event": event_data(event),
+                "offsets": offsets,
+                "lanes": lanes,
+                "start": chunk_start,
+                "end": chunk_start + chunk_length
+            }
+            futures.append(executor.submit(search_chunk, task))
+            chunk_start += chunk_length
+
+        def finished(chunk):
+            def callback(future):
+                if control_view[0] != search_id or future.cancelled() or future.exception() is not None or future.result() is None:
+                    return
+                if chunk < control_view[1]:
+                    control_view[1] = chunk
+                for later in futures[chunk + 1:]:
+                    later.cancel()
+            return callback
+
+        for chunk, future in enumerate(futures):
+            future.add_done_callback(finished(chunk))
+        try:
+            for future in futures:
+                try:
+                    slot = future.result()
+                except CancelledError:
+                    continue
+                if slot is not None:
+                    return [slot]
+            return []
+        except BrokenProcessPool:
+            # A worker died (killed, out of memory): drop the pool and search here.
+            pool.shutdown(cancel_futures=True)
+            pool = None
+            return event.search_slots(offsets, earliest_start, 1, lanes)
+        finally:
+            control_view[0] = 0
+            for future in futures:
+                future.cancel()
+
+def shutdown():
+    global pool, control, control_view, snapshot
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+        pool = None
+    if snapshot is not None:
+        snapshot.release()
+        snapshot = None
+    if control is not None:
+        control_view.release()
+        control.close()
+        control.unlink()
+        control = control_view = None
+
+atexit.register(shutdown)
+
+def find_available_series(event, earliest_start=None, lanes=None, workers=None):
+    return search_slots(event, [timedelta(days=i * event.interval) for i in range(event.repeats)], earliest_start, lanes, workers)
+
+def find_available_slots(event, earliest_start=None, lanes=None, workers=None):
+    return search_slots(event, [timedelta(0)], earliest_start, lanes, workers)
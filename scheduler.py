@@ -1,15 +1,464 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
 from datetime import datetime, timedelta
-import json
-from pathlib import Path
+from functools import wraps
+from itertools import count
+import threading
+import numpy as np
+import metrics
+from storage import VersionConflict, get_event_store, load_json
 
-def load_json(filename):
-    return json.loads(Path(filename).read_text())
+RESOURCES = ["junior_pilots", "senior_pilots", "tugboats", "maintenance_teams"]
+RESOURCE_LABELS = {
+    "junior_pilots": "junior pilots",
+    "senior_pilots": "senior pilots",
+    "tugboats": "tugboats",
+    "maintenance_teams": "maintenance teams"
+}
 
-resources_data = load_json("resources.json")
-restrictions_data = load_json("restrictions.json")
+Rule = namedtuple("Rule", [
+    "name",
+    "min_duration_hours",
+    "max_duration_hours",
+    "requirements",
+    "lanes",
+    "lane_list",
+    "duration_error",
+    "requirement_errors",
+    "locks_error"
+])
+
+def compile_rules(restrictions):
+    rules = {}
+    keys = [("Lock maintenance", None, "lock maintenance")]
+    keys += [("Transit", vessel_size, f"{vessel_size.lower()} vessel transit") for vessel_size in ["Small", "Medium", "Large"]]
+    for subtype, vessel_size, name in keys:
+        if name not in restrictions:
+            continue
+        restriction = restrictions[name]
+        minimum = restriction["min_duration_hours"]
+        maximum = restriction["max_duration_hours"]
+        rules[(subtype, vessel_size)] = Rule(
+            name=name,
+            min_duration_hours=minimum,
+            max_duration_hours=maximum,
+            requirements=tuple((resource, restriction[resource]) for resource in RESOURCES),
+            lanes=frozenset(frozenset(lane) for lane in restriction["locks"]),
+            lane_list=[list(lane) for lane in restriction["locks"]],
+            duration_error=f"{name.capitalize()} duration must be between {minimum} and {maximum} hours.",
+            requirement_errors={
+                resource: f"The amount of selected {RESOURCE_LABELS[resource]} does not match the required amount of {RESOURCE_LABELS[resource]} for a {name} ({restriction[resource]})."
+                for resource in RESOURCES
+            },
+            locks_error="A lock maintenance requires only one lock." if subtype == "Lock maintenance" else f"A {name} requires three locks in a row and only three locks."
+        )
+    return rules
+
+resources_data = None
+restrictions_data = None
+rules = {}
+CHECKPOINT_STEP = timedelta(hours=1)
+
+def time_resolution(resources):
+    # Checkpoints stay aligned with the hour, so the resolution has to divide it.
+    minutes = resources.get("time_resolution_minutes", 60)
+    if not isinstance(minutes, int) or minutes <= 0 or 60 % minutes:
+        raise ValueError(f"time_resolution_minutes must divide an hour, got {minutes}.")
+    return timedelta(minutes=minutes)
+
+def refresh_config():
+    global resources_data, restrictions_data, rules, CHECKPOINT_STEP
+    resources_data = load_json("resources.json")
+    CHECKPOINT_STEP = time_resolution(resources_data)
+    latest_restrictions = load_json("restrictions.json")
+    if latest_restrictions is not restrictions_data:
+        restrictions_data = latest_restrictions
+        rules = compile_rules(restrictions_data)
+
+refresh_config()
+
+def rule_for(subtype, vessel_size=None):
+    return rules.get((subtype, vessel_size if subtype == "Transit" else None))
+
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+
+def first_checkpoint(origin, moment, step):
+    return origin - ((origin - moment) // step) * step
+
+def next_checkpoint(moment=None):
+    moment = moment if moment is not None else datetime.now()
+    hour = moment.replace(minute=0, second=0, microsecond=0)
+    return hour + ((moment - hour) // CHECKPOINT_STEP + 1) * CHECKPOINT_STEP
+
+def to_seconds(moment):
+    return (moment - EPOCH) // SECOND
+
+def from_seconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+lock_bits = {}
+event_kinds = []
+
+def lock_bit(lock):
+    if lock not in lock_bits:
+        lock_bits[lock] = 1 << len(lock_bits)
+    return lock_bits[lock]
+
+def lock_mask(locks):
+    mask = 0
+    for lock in locks or ():
+        mask |= lock_bit(lock)
+    return mask
+
+def mask_locks(mask):
+    return [lock for lock, bit in lock_bits.items() if mask & bit]
+
+def kind_code(subtype, vessel_size):
+    kind = (subtype, vessel_size if subtype == "Transit" else None)
+    if kind not in event_kinds:
+        event_kinds.append(kind)
+    return event_kinds.index(kind)
+
+# The shared index is patched in place by whichever thread saves, one column at a
+# time, so every read that walks it holds the same lock as those writes.
+index_lock = threading.RLock()
+
+def holding_index_lock(function):
+    @wraps(function)
+    def locked(*args, **kwargs):
+        with index_lock:
+            return function(*args, **kwargs)
+    return locked
+
+class OccupancyIndex:
+    # Events are kept as parallel columns sorted by start: epoch seconds, resource
+    # counts and a lock bitmask, so overlaps are integer comparisons and lock
+    # clashes a bitwise AND. Queries return row positions into the columns.
+    def __init__(self, events_data=()):
+        self.starts = array("q")
+        self.ids = array("q")
+        self.ends = array("q")
+        self.lock_masks = array("q")
+        self.kinds = array("B")
+        self.demand = [array("h") for resource in RESOURCES]
+        self.max_duration = 0
+        self.changes = 0
+        rows = sorted(self.row(event_data) for event_data in events_data)
+        for column, values in zip(self.columns(), zip(*rows)):
+            column.extend(values)
+        self.max_duration = max((end - start for start, end in zip(self.starts, self.ends)), default=0)
+
+    def columns(self):
+        return [self.starts, self.ids, self.ends, self.lock_masks, self.kinds] + self.demand
+
+    def set_columns(self, columns, max_duration):
+        self.starts, self.ids, self.ends, self.lock_masks, self.kinds = columns[:5]
+        self.demand = list(columns[5:])
+        self.max_duration = max_duration
+
+    def row(self, event_data):
+        return (
+            to_seconds(datetime.fromisoformat(event_data["start_datetime"])),
+            int(event_data.get("id") or 0),
+            to_seconds(datetime.fromisoformat(event_data["end_datetime"])),
+            lock_mask(event_data["locks"]),
+            kind_code(event_data.get("subtype"), event_data.get("vessel_size"))
+        ) + tuple(event_data.get(resource) or 0 for resource in RESOURCES)
+
+    def event(self, position):
+        subtype, vessel_size = event_kinds[self.kinds[position]]
+        event = {
+            "id": str(self.ids[position]),
+            "start_datetime": from_seconds(self.starts[position]),
+            "end_datetime": from_seconds(self.ends[position]),
+            "subtype": subtype,
+            "vessel_size": vessel_size,
+            "locks": mask_locks(self.lock_masks[position])
+        }
+        for resource, column in zip(RESOURCES, self.demand):
+            event[resource] = column[position]
+        return event
+
+    def __len__(self):
+        return len(self.starts)
+
+    @holding_index_lock
+    def insert_row(self, row):
+        position = bisect_right(self.starts, row[0])
+        for column, value in zip(self.columns(), row):
+            column.insert(position, value)
+        self.max_duration = max(self.max_duration, row[2] - row[0])
+        self.changes += 1
+
+    def add(self, event_data):
+        self.insert_row(self.row(event_data))
+
+    @holding_index_lock
+    def remove(self, event_id):
+        try:
+            position = self.ids.index(int(event_id))
+        except ValueError:
+            return False
+        for column in self.columns():
+            del column[position]
+        self.changes += 1
+        return True
+
+    @holding_index_lock
+    def remove_many(self, event_ids):
+        # One pass over the columns, for deletions too large to splice row by row.
+        removed = {int(event_id) for event_id in event_ids}
+        kept = [position for position, event_id in enumerate(self.ids) if event_id not in removed]
+        if len(kept) == len(self.ids):
+            return 0
+        removed_rows = len(self.ids) - len(kept)
+        for column in self.columns():
+            column[:] = array(column.typecode, [column[position] for position in kept])
+        self.changes += 1
+        return removed_rows
+
+    def busy_locks(self, start, end):
+        busy = 0
+        for position in self.overlapping(start, end):
+            busy |= self.lock_masks[position]
+        return busy
+
+    def lock_is_free(self, lock, start, end):
+        return not self.busy_locks(start, end) & lock_bit(lock)
+
+    def free_intervals(self, lock, start, end):
+        intervals = []
+        free_from = start
+        bit = lock_bit(lock)
+        for position in self.overlapping(start, end):
+            if not self.lock_masks[position] & bit:
+                continue
+            busy_start, busy_end = from_seconds(self.starts[position]), from_seconds(self.ends[position])
+            if busy_start > free_from:
+                intervals.append((free_from, busy_start))
+            free_from = max(free_from, busy_end)
+        if free_from < end:
+            intervals.append((free_from, end))
+        return intervals
+
+    def overlapping(self, start, end):
+        # Every stored event lasts at most max_duration, so only events starting in
+        # (start - max_duration, end) can overlap [start, end).
+        start, end = to_seconds(start), to_seconds(end)
+        ends = self.ends
+        low = bisect_right(self.starts, start - self.max_duration)
+        high = bisect_left(self.starts, end)
+        if metrics.enabled:
+            metrics.count("index.events_scanned", high - low)
+        return [position for position in range(low, high) if ends[position] > start]
+
+    def overlapping_many(self, windows):
+        # Windows of a series are sorted, so each bisect can resume where the
+        # previous window left off instead of searching the whole index again.
+        ends = self.ends
+        results = []
+        low = 0
+        for start, end in windows:
+            start, end = to_seconds(start), to_seconds(end)
+            low = bisect_right(self.starts, start - self.max_duration, low)
+            high = bisect_left(self.starts, end, low)
+            if metrics.enabled:
+                metrics.count("index.events_scanned", high - low)
+            results.append([position for position in range(low, high) if ends[position] > start])
+        return results
+
+    def sweep(self, start, end, positions=None):
+        # Works in epoch seconds: segments are (start, end, usage, busy lock mask).
+        if positions is None:
+            positions = self.overlapping(from_seconds(start), from_seconds(end))
+        breakpoints = []
+        for position in positions:
+            breakpoints.append((max(self.starts[position], start), 1, position))
+            if self.ends[position] < end:
+                breakpoints.append((self.ends[position], -1, position))
+        breakpoints.sort()
+        usage = dict.fromkeys(RESOURCES, 0)
+        lock_counts = {}
+        used_locks = 0
+        segments = []
+        segment_start = start
+        for moment, delta, position in breakpoints:
+            if moment > segment_start:
+                segments.append((segment_start, moment, dict(usage), used_locks))
+                segment_start = moment
+            for resource, column in zip(RESOURCES, self.demand):
+                usage[resource] += delta * column[position]
+            mask = self.lock_masks[position]
+            while mask:
+                bit = mask & -mask
+                lock_counts[bit] = lock_counts.get(bit, 0) + delta
+                if lock_counts[bit]:
+                    used_locks |= bit
+                else:
+                    used_locks &= ~bit
+                mask ^= bit
+        segments.append((segment_start, end, usage, used_locks))
+        return segments
+
+    def peak_usage(self, start, end):
+        peak = dict.fromkeys(RESOURCES, 0)
+        for segment_start, segment_end, usage, used_locks in self.sweep(to_seconds(start), to_seconds(end)):
+            for resource in RESOURCES:
+                peak[resource] = max(peak[resource], usage[resource])
+        return peak
+
+occupancy_index = None
+occupancy_version = None
+
+@holding_index_lock
+def apply_store_change(change, events_data):
+    # This process's own writes patch the cached index in place; writes from other
+    # processes show up through external_version and rebuild it instead.
+    if occupancy_index is None:
+        return
+    if change == "delete" and len(events_data) > 1:
+        occupancy_index.remove_many(event_data["id"] for event_data in events_data)
+        return
+    for event_data in events_data:
+        if change == "create":
+            occupancy_index.add(event_data)
+        elif change == "delete":
+            occupancy_index.remove(event_data["id"])
+
+pinned_index = None
+
+@holding_index_lock
+def get_occupancy_index():
+    global occupancy_index, occupancy_version
+    if pinned_index is not None:
+        # Worker processes search a read-only snapshot instead of the store.
+        return pinned_index
+    event_store = get_event_store()
+    external_version = event_store.external_version()
+    if occupancy_index is None or occupancy_version != external_version:
+        occupancy_index = OccupancyIndex(event_store.scan())
+        if metrics.enabled:
+            metrics.count("index.rebuilds")
+        occupancy_version = external_version
+        event_store.subscribe(apply_store_change)
+    return occupancy_index
+
+capacity_cache = None
+
+@holding_index_lock
+def capacity_timeline(origin=None, horizon=timedelta(days=60)):
+    # Free resources and lock occupancy at every checkpoint of the horizon, in one
+    # vectorised pass over the index columns. The result is reused until the
+    # schedule, the configuration or the origin changes.
+    global capacity_cache
+    refresh_config()
+    index = get_occupancy_index()
+    if origin is None:
+        origin = next_checkpoint()
+    hours = horizon // CHECKPOINT_STEP
+    key = (id(index), index.changes, origin, CHECKPOINT_STEP, hours, tuple(resources_data[resource] for resource in RESOURCES), tuple(resources_data["locks"]))
+    if capacity_cache is not None and capacity_cache[0] == key:
+        return capacity_cache[1]
+    step = CHECKPOINT_STEP // SECOND
+    base = to_seconds(origin)
+    # An event covers the checkpoints in [ceil(start), ceil(end)) on the grid.
+    first = (-((base - np.asarray(index.starts, dtype=np.int64)) // step)).clip(0, hours)
+    last = (-((base - np.asarray(index.ends, dtype=np.int64)) // step)).clip(0, hours)
+    free = {}
+    for resource, column in zip(RESOURCES, index.demand):
+        demand = np.asarray(column, dtype=np.int64)
+        difference = np.zeros(hours + 1, dtype=np.int64)
+        np.add.at(difference, first, demand)
+        np.add.at(difference, last, -demand)
+        free[resource] = resources_data[resource] - np.cumsum(difference)[:hours]
+    masks = np.asarray(index.lock_masks, dtype=np.int64)
+    locks = {}
+    for lock in resources_data["locks"]:
+        selected = (masks & lock_bit(lock)) != 0
+        difference = np.zeros(hours + 1, dtype=np.int64)
+        np.add.at(difference, first[selected], 1)
+        np.add.at(difference, last[selected], -1)
+        locks[lock] = np.cumsum(difference)[:hours]
+    timeline = {"origin": origin, "step": CHECKPOINT_STEP, "hours": hours, "free": free, "locks": locks}
+    capacity_cache = (key, timeline)
+    return timeline
+
+AVAILABILITY_CACHE_SIZE = 20000
+MISSING = object()
+
+class AvailabilityCache:
+    # Conflict checks and release times of single windows, keyed by the window, the
+    # resource demand and the locks. Entries are stamped with the schedule version
+    # they were computed against: any save or delete moves the version on and the
+    # whole cache is dropped on the next lookup.
+    def __init__(self, size=AVAILABILITY_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, version, key):
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.invalidations += 1
+                    self.entries.clear()
+                self.version = version
+            value = self.entries.get(key, MISSING)
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, version, key, value):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = value
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+availability_cache = AvailabilityCache()
+
+def availability_version(index):
+    # The index itself rather than its id, so a rebuilt index can never be
+    # mistaken for the one the entries were computed against.
+    return (index, index.changes, CHECKPOINT_STEP, tuple(resources_data[resource] for resource in RESOURCES))
 
 class Event:
+    __slots__ = (
+        "type", "repeats", "interval", "start_datetime", "end_datetime", "duration_hours", "subtype", "vessel_size",
+        "junior_pilots", "senior_pilots", "tugboats", "maintenance_teams", "locks", "error_messages"
+    )
+
     def __init__(self, data):
+        refresh_config()
         self.type = data.get("type")
         if self.type == "Recurring event":
             self.repeats = data.get("repeats")
@@ -44,33 +493,11 @@ class Event:
         return not has_errors
 
     def validate_duration_restrictions(self):
-        has_errors = False
-        if self.subtype == "Lock maintenance":
-            minimum = restrictions_data["lock maintenance"]["min_duration_hours"]
-            maximum = restrictions_data["lock maintenance"]["max_duration_hours"]
-            if self.duration_hours < minimum or self.duration_hours > maximum:
-                self.error_messages.append(f"Lock maintenance duration must be between {minimum} and {maximum} hours.")
-                has_errors = True   
-        elif self.subtype == "Transit":
-            if self.vessel_size == "Small":
-                minimum = restrictions_data["small vessel transit"]["min_duration_hours"]
-                maximum = restrictions_data["small vessel transit"]["max_duration_hours"]
-                if self.duration_hours < minimum or self.duration_hours > maximum:
-                    self.error_messages.append(f"Small vessel transit duration must be between {minimum} and {maximum} hours.")
-                    has_errors = True
-            elif self.vessel_size == "Medium":
-                minimum = restrictions_data["medium vessel transit"]["min_duration_hours"]
-                maximum = restrictions_data["medium vessel transit"]["max_duration_hours"]
-                if self.duration_hours < minimum or self.duration_hours > maximum:
-                    self.error_messages.append(f"Medium vessel transit duration must be between {minimum} and {maximum} hours.")
-                    has_errors = True
-            elif self.vessel_size == "Large":
-                minimum = restrictions_data["large vessel transit"]["min_duration_hours"]
-                maximum = restrictions_data["large vessel transit"]["max_duration_hours"]
-                if self.duration_hours < minimum or self.duration_hours > maximum:
-                    self.error_messages.append(f"Large vessel transit duration must be between {minimum} and {maximum} hours.")
-                    has_errors = True
-        return not has_errors
+        rule = rule_for(self.subtype, getattr(self, "vessel_size", None))
+        if rule is not None and (self.duration_hours < rule.min_duration_hours or self.duration_hours > rule.max_duration_hours):
+            self.error_messages.append(rule.duration_error)
+            return False
+        return True
     
     def validate_resources_logic(self):
         has_errors = False
@@ -89,96 +516,193 @@ class Event:
         return not has_errors
             
     def validate_resources_restrictions(self):
+        if self.subtype not in ("Lock maintenance", "Transit"):
+            return True
+        rule = rules[(self.subtype, self.vessel_size if self.subtype == "Transit" else None)]
         has_errors = False
-        if self.subtype == "Lock maintenance":
-            if self.junior_pilots != restrictions_data["lock maintenance"]["junior_pilots"]:
-                self.error_messages.append(f"The amount of selected junior pilots does not match the required amount of junior pilots for a lock maintenance ({restrictions_data["lock maintenance"]["junior_pilots"]}).")
-                has_errors = True
-            if self.senior_pilots != restrictions_data["lock maintenance"]["senior_pilots"]:
-                self.error_messages.append(f"The amount of selected senior pilots does not match the required amount of senior pilots for a lock maintenance ({restrictions_data["lock maintenance"]["senior_pilots"]}).")
-                has_errors = True
-            if self.tugboats != restrictions_data["lock maintenance"]["tugboats"]:
-                self.error_messages.append(f"The amount of selected tugboats does not match the required amount of tugboats for a lock maintenance ({restrictions_data["lock maintenance"]["tugboats"]}).")
-                has_errors = True
-            if self.maintenance_teams != restrictions_data["lock maintenance"]["maintenance_teams"]:
-                self.error_messages.append(f"The amount of selected maintenance teams does not match the required amount of maintenance teams for a lock maintenance ({restrictions_data["lock maintenance"]["maintenance_teams"]}).")
-                has_errors = True
-            if self.locks not in restrictions_data["lock maintenance"]["locks"]:
-                self.error_messages.append("A lock maintenance requires only one lock.")
-                has_errors = True
-        elif self.subtype == "Transit":
-            locks = sorted(self.locks)
-            subtype = f"{self.vessel_size.lower()} vessel transit"
-            if self.junior_pilots != restrictions_data[subtype]["junior_pilots"]:
-                self.error_messages.append(f"The amount of selected junior pilots does not match the required amount of junior pilots for a {subtype} ({restrictions_data[subtype]['junior_pilots']}).")
-                has_errors = True
-            if self.senior_pilots != restrictions_data[subtype]["senior_pilots"]:
-                self.error_messages.append(f"The amount of selected senior pilots does not match the required amount of senior pilots for a {subtype} ({restrictions_data[subtype]['senior_pilots']}).")
-                has_errors = True
-            if self.tugboats != restrictions_data[subtype]["tugboats"]:
-                self.error_messages.append(f"The amount of selected tugboats does not match the required amount of tugboats for a {subtype} ({restrictions_data[subtype]['tugboats']}).")
-                has_errors = True
-            if self.maintenance_teams != restrictions_data[f"{subtype}"]["maintenance_teams"]:
-                self.error_messages.append(f"The amount of selected maintenance teams does not match the required amount of maintenance teams for a {subtype} ({restrictions_data[f'{subtype}']['maintenance_teams']}).")
-                has_errors = True
-            if locks not in restrictions_data[subtype]["locks"]:
-                self.error_messages.append(f"A {subtype} requires three locks in a row and only three locks.")
+        for resource, required in rule.requirements:
+            if getattr(self, resource) != required:
+                self.error_messages.append(rule.requirement_errors[resource])
                 has_errors = True
+        locks = self.locks or ()
+        if frozenset(locks) not in rule.lanes or len(set(locks)) != len(locks):
+            self.error_messages.append(rule.locks_error)
+            has_errors = True
         return not has_errors
     
     def static_validations(self):
         return (self.validate_datetime_logic() and self.validate_duration_restrictions() and self.validate_resources_logic() and self.validate_resources_restrictions())
     
+    def cached(self, index, kind, start, end, compute):
+        version = availability_version(index)
+        key = (kind, start, end, self.junior_pilots, self.senior_pilots, self.tugboats, self.maintenance_teams, tuple(self.locks))
+        value = availability_cache.get(version, key)
+        if value is MISSING:
+            value = compute()
+            availability_cache.put(version, key, value)
+        return value
+
+    @holding_index_lock
+    def conflicts(self, start, end, overlapping_events=None):
+        return self.cached(get_occupancy_index(), "conflicts", start, end, lambda: self.scan_conflicts(start, end, overlapping_events))
+
+    def scan_conflicts(self, start, end, overlapping_events=None):
+        index = get_occupancy_index()
+        if overlapping_events is None:
+            overlapping_events = index.overlapping(start, end)
+        found = []
+        if not overlapping_events:
+            return found
+        own_locks = [(lock, lock_bit(lock)) for lock in self.locks]
+        step = CHECKPOINT_STEP // SECOND
+        start = to_seconds(start)
+        for segment_start, segment_end, usage, used_locks in index.sweep(start, to_seconds(end), overlapping_events):
+            exceeded = [RESOURCE_LABELS[resource] for resource in RESOURCES if (usage[resource] + getattr(self, resource)) > resources_data[resource]]
+            busy_locks = [lock for lock, bit in own_locks if used_locks & bit]
+            if not exceeded and not busy_locks:
+                continue
+            current_checkpoint = first_checkpoint(start, segment_start, step)
+            while current_checkpoint < segment_end:
+                found.append((from_seconds(current_checkpoint), exceeded, busy_locks))
+                current_checkpoint += step
+        if metrics.enabled:
+            metrics.count("conflicts.checkpoints", len(found))
+        return found
+
+    @holding_index_lock
     def validate_resources_availability(self):
-        events_data = load_json("events.json")
-        has_errors = False
-        overlapping_events = []
-        for event_data in events_data:
-            if type(event_data) == str:
-                pass
-            else:
-                event_start = datetime.fromisoformat(event_data["start_datetime"])
-                event_end = datetime.fromisoformat(event_data["end_datetime"])
-                if (self.start_datetime < event_end and self.end_datetime > event_start):
-                    parsed_event_data = event_data.copy()
-                    parsed_event_data["start_datetime"] = event_start
-                    parsed_event_data["end_datetime"] = event_end
-                    overlapping_events.append(parsed_event_data)
+        overlapping_events = get_occupancy_index().overlapping(self.start_datetime, self.end_datetime)
         if not overlapping_events:
             return True, None
-        current_checkpoint = self.start_datetime
-        while current_checkpoint < self.end_datetime:
-            used_junior_pilots = 0
-            used_senior_pilots = 0
-            used_tugboats = 0
-            used_maintenance_teams = 0
-            used_locks = []
-            for event in overlapping_events:
-                if event["start_datetime"] <= current_checkpoint < event["end_datetime"]:
-                    used_junior_pilots += event["junior_pilots"]
-                    used_senior_pilots += event["senior_pilots"]
-                    used_tugboats += event["tugboats"]
-                    used_maintenance_teams += event["maintenance_teams"]
-                    used_locks.extend(event["locks"])
-            if (used_junior_pilots + self.junior_pilots) > resources_data["junior_pilots"]:
-                self.error_messages.append(f"Not enough junior pilots available at {current_checkpoint.strftime('%Y-%m-%d %H:%M')} .")
-                has_errors = True
-            if (used_senior_pilots + self.senior_pilots) > resources_data["senior_pilots"]:
-                self.error_messages.append(f"Not enough senior pilots available at {current_checkpoint.strftime('%Y-%m-%d %H:%M')} .")
-                has_errors = True
-            if (used_tugboats + self.tugboats) > resources_data["tugboats"]:
-                self.error_messages.append(f"Not enough tugboats available at {current_checkpoint.strftime('%Y-%m-%d %H:%M')} .")
-                has_errors = True
-            if (used_maintenance_teams + self.maintenance_teams) > resources_data["maintenance_teams"]:
-                self.error_messages.append(f"Not enough maintenance teams available at {current_checkpoint.strftime('%Y-%m-%d %H:%M')} .")
-                has_errors = True
-            for lock in self.locks:
-                if lock in used_locks:
-                    self.error_messages.append(f"Lock {lock} is already in use at {current_checkpoint.strftime('%Y-%m-%d %H:%M')} .")
-                    has_errors = True
-            current_checkpoint += timedelta(hours=1)
-        return not has_errors, self.error_messages
-    
+        conflicts = self.conflicts(self.start_datetime, self.end_datetime, overlapping_events)
+        self.error_messages.extend(self.conflict_messages(conflicts))
+        return not conflicts, self.error_messages
+
+    def conflict_messages(self, conflicts):
+        messages = []
+        for current_checkpoint, exceeded, busy_locks in conflicts:
+            checkpoint_text = current_checkpoint.strftime('%Y-%m-%d %H:%M')
+            for label in exceeded:
+                messages.append(f"Not enough {label} available at {checkpoint_text} .")
+            for lock in busy_locks:
+                messages.append(f"Lock {lock} is already in use at {checkpoint_text} .")
+        return messages
+
+    @holding_index_lock
+    def explain_conflicts(self, offsets=None, search=True):
+        # One sweep per window: conflicting checkpoints are merged into ranges per
+        # resource and lock, each range names the events holding it, and the fixes
+        # that clear every conflict are proposed: another lane, a shorter stay
+        # within the restrictions or, when search is set, the nearest free start.
+        index = get_occupancy_index()
+        offsets = offsets or [timedelta(0)]
+        duration = self.end_datetime - self.start_datetime
+        windows = [(self.start_datetime + offset, self.start_datetime + offset + duration) for offset in offsets]
+        step = CHECKPOINT_STEP // SECOND
+        own_locks = [(lock, lock_bit(lock)) for lock in self.locks]
+        ranges = []
+        busy = 0
+        resource_conflicts = False
+        first_offset = None
+        last_offset = None
+        for occurrence, ((start, end), positions) in enumerate(zip(windows, index.overlapping_many(windows)), start=1):
+            start, end = to_seconds(start), to_seconds(end)
+            open_ranges = {}
+            window_ranges = []
+            for segment_start, segment_end, usage, used_locks in index.sweep(start, end, positions):
+                checkpoint = first_checkpoint(start, segment_start, step)
+                if checkpoint >= segment_end:
+                    continue
+                last_checkpoint = checkpoint + (segment_end - 1 - checkpoint) // step * step
+                busy |= used_locks
+                blocked = [(resource, None) for resource in RESOURCES if (usage[resource] + getattr(self, resource)) > resources_data[resource]]
+                blocked.extend((lock, bit) for lock, bit in own_locks if used_locks & bit)
+                if not blocked:
+                    continue
+                resource_conflicts = resource_conflicts or blocked[0][1] is None
+                first_offset = min(first_offset, checkpoint - start) if first_offset is not None else checkpoint - start
+                last_offset = max(last_offset, last_checkpoint - start) if last_offset is not None else last_checkpoint - start
+                for name, bit in blocked:
+                    current = open_ranges.get(name)
+                    if current is not None and current["last"] + step == checkpoint:
+                        current["last"] = last_checkpoint
+                        continue
+                    current = open_ranges[name] = {"occurrence": occurrence, "resource": name, "bit": bit, "first": checkpoint, "last": last_checkpoint, "blocking": []}
+                    window_ranges.append(current)
+            for position in positions:
+                for current in window_ranges:
+                    if index.starts[position] <= current["last"] and index.ends[position] > current["first"]:
+                        if current["bit"] is None:
+                            holds = index.demand[RESOURCES.index(current["resource"])][position]
+                        else:
+                            holds = index.lock_masks[position] & current["bit"]
+                        if holds:
+                            current["blocking"].append(str(index.ids[position]))
+            for current in window_ranges:
+                ranges.append({
+                    "occurrence": current["occurrence"],
+                    "resource": current["resource"] if current["bit"] is None else None,
+                    "lock": current["resource"] if current["bit"] is not None else None,
+                    "start_datetime": from_seconds(current["first"]),
+                    "end_datetime": from_seconds(min(current["last"] + step, end)),
+                    "blocking": current["blocking"]
+                })
+        suggestions = []
+        rule = rule_for(self.subtype, getattr(self, "vessel_size", None))
+        if ranges and rule is not None:
+            # Maintenance is booked on the lock it services, so only transits can switch lanes.
+            if not resource_conflicts and self.subtype != "Lock maintenance":
+                for lane in rule.lane_list:
+                    if not lock_mask(lane) & busy:
+                        suggestions.append({"fix": "lane", "locks": list(lane)})
+            # Every window was checked in full, so ending before the first conflict or
+            # starting after the last one clears them all.
+            shorter = timedelta(seconds=first_offset)
+            if shorter and shorter >= timedelta(hours=rule.min_duration_hours):
+                suggestions.append({"fix": "end", "start_datetime": self.start_datetime, "end_datetime": self.start_datetime + shorter})
+            later = timedelta(seconds=last_offset + step)
+            if later < duration and duration - later >= timedelta(hours=rule.min_duration_hours):
+                suggestions.append({"fix": "start", "start_datetime": self.start_datetime + later, "end_datetime": self.end_datetime})
+        if ranges and search:
+            slots = self.search_slots(offsets, self.start_datetime + CHECKPOINT_STEP)
+            if slots:
+                suggestions.append({"fix": "move", "start_datetime": slots[0][0], "end_datetime": slots[0][1]})
+        return {"conflicts": ranges, "suggestions": suggestions}
+
+    def last_conflict(self, start, end, overlapping_events):
+        # Walks the sweep segments backwards, so the cost follows the number of
+        # events around the window and not the number of checkpoints in it.
+        if not overlapping_events:
+            return None
+        step = CHECKPOINT_STEP // SECOND
+        start = to_seconds(start)
+        own_mask = lock_mask(self.locks)
+        for segment_start, segment_end, usage, used_locks in reversed(get_occupancy_index().sweep(start, to_seconds(end), overlapping_events)):
+            checkpoint = first_checkpoint(start, segment_start, step)
+            if checkpoint >= segment_end:
+                continue
+            if used_locks & own_mask or any((usage[resource] + getattr(self, resource)) > resources_data[resource] for resource in RESOURCES):
+                return checkpoint + (segment_end - 1 - checkpoint) // step * step
+        return None
+
+    @holding_index_lock
+    def next_release(self, start, end, overlapping_events=None):
+        return self.cached(get_occupancy_index(), "release", start, end, lambda: self.release_after(start, end, overlapping_events))
+
+    def release_after(self, start, end, overlapping_events=None):
+        index = get_occupancy_index()
+        if overlapping_events is None:
+            overlapping_events = index.overlapping(start, end)
+        last_checkpoint = self.last_conflict(start, end, overlapping_events)
+        if last_checkpoint is None:
+            return None
+        # Usage at the last conflicting checkpoint can only drop once one of the
+        # events active there ends, so no window covering that gap can succeed.
+        release = min((index.ends[position] for position in overlapping_events if index.starts[position] <= last_checkpoint < index.ends[position]), default=None)
+        if release is None:
+            return datetime.max
+        return first_checkpoint(start, from_seconds(release), CHECKPOINT_STEP)
+
     def validate_recurrence_limits(self):
         has_errors = False
         if self.type == "Recurring event":
@@ -190,54 +714,323 @@ class Event:
     def static_validations_recurrences(self):
         return (self.static_validations() and self.validate_recurrence_limits())
     
+    def occurrences(self, start_datetime=None):
+        if start_datetime is None:
+            start_datetime = self.start_datetime
+        duration = self.end_datetime - self.start_datetime
+        windows = []
+        for i in range(self.repeats):
+            start = start_datetime + timedelta(days=i * self.interval)
+            windows.append((start, start + duration))
+        return windows
+
+    @holding_index_lock
     def validate_recurrences(self):
         has_errors = False
-        for i in range(self.repeats):
-            step = i + 1
-            start = self.start_datetime + timedelta(days=i * self.interval)
-            end = self.end_datetime + timedelta(days=i * self.interval)
-            temporal_event_data = {
-                "type": self.type,
-                "repeats": self.repeats,
-                "interval": self.interval,
-                "start_datetime": start.isoformat(),
-                "end_datetime": end.isoformat(),
-                "subtype": self.subtype,
-                "vessel_size": self.vessel_size if self.subtype == "Transit" else None,
-                "junior_pilots": self.junior_pilots,
-                "senior_pilots": self.senior_pilots,
-                "tugboats": self.tugboats,
-                "maintenance_teams": self.maintenance_teams,
-                "locks": self.locks
-            }
-            temporal_event = Event(temporal_event_data)
-            is_valid, error_messages = temporal_event.validate_resources_availability()
-            if not is_valid:
-                error_message = f"Errors in recurrence {step}:"
-                for error in temporal_event.error_messages:
+        windows = self.occurrences()
+        overlapping = get_occupancy_index().overlapping_many(windows)
+        for i, (start, end) in enumerate(windows):
+            conflicts = self.conflicts(start, end, overlapping[i])
+            if conflicts:
+                error_message = f"Errors in recurrence {i + 1}:"
+                for error in self.conflict_messages(conflicts):
                     error_message += (f"\n + {error}")
                 self.error_messages.append(error_message)
                 has_errors = True
         return not has_errors, self.error_messages
 
-    def one_time_event_next_available_datetime(self):
-        while self.end_datetime < (datetime.now() + timedelta(days=59, hours=23)):
-            self.start_datetime += timedelta(hours=1)
-            self.end_datetime += timedelta(hours=1)
-            self.error_messages = []
-            if self.validate_resources_availability()[0]:
-                return True, "The selected datetime is unavailable", self.start_datetime, self.end_datetime
-            else:
-                continue
+    def lane_options(self):
+        return rule_for(self.subtype, getattr(self, "vessel_size", None)).lane_list
+
+    @holding_index_lock
+    def free_lanes(self, start=None, end=None):
+        start = start if start is not None else self.start_datetime
+        end = end if end is not None else self.end_datetime
+        busy = get_occupancy_index().busy_locks(start, end)
+        return [lane for lane in self.lane_options() if not lock_mask(lane) & busy]
+
+    @holding_index_lock
+    def assign_lane(self):
+        for lane in self.free_lanes():
+            self.locks = list(lane)
+            if not self.conflicts(self.start_datetime, self.end_datetime):
+                return self.locks
+        return None
+
+    @holding_index_lock
+    def search_slots(self, offsets, earliest_start=None, count=1, lanes=None, latest_start=None, cancelled=None):
+        duration = self.end_datetime - self.start_datetime
+        horizon_end = datetime.now() + timedelta(days=60)
+        candidate = earliest_start if earliest_start is not None else self.start_datetime
+        chosen_locks = self.locks
+        slots = []
+        try:
+            while len(slots) < count and candidate + offsets[-1] + duration <= horizon_end:
+                if (latest_start is not None and candidate >= latest_start) or (cancelled is not None and cancelled()):
+                    break
+                if metrics.enabled:
+                    metrics.count("search.candidates")
+                windows = [(candidate + offset, candidate + offset + duration) for offset in offsets]
+                index = get_occupancy_index()
+                overlapping = []
+                def window_release(position, start, end):
+                    # Shifting a series by whole intervals recreates windows already
+                    # checked, so the overlap lookup only runs when one is new.
+                    if not overlapping:
+                        overlapping.extend(index.overlapping_many(windows))
+                    return self.release_after(start, end, overlapping[position])
+                next_candidate = None
+                for lane in (lanes if lanes is not None else [chosen_locks]):
+                    self.locks = lane
+                    lane_candidate = None
+                    for position, (start, end) in enumerate(windows):
+                        release = self.cached(index, "release", start, end, lambda: window_release(position, start, end))
+                        if release is None:
+                            continue
+                        if release == datetime.max:
+                            lane_candidate = datetime.max
+                            break
+                        # Every shift that keeps this occurrence over its conflict fails too.
+                        shifted = release - (start - candidate)
+                        if lane_candidate is None or shifted > lane_candidate:
+                            lane_candidate = shifted
+                    if lane_candidate is None:
+                        slots.append((candidate, candidate + duration, list(lane)))
+                        next_candidate = candidate + CHECKPOINT_STEP
+                        break
+                    # Another lane may free up sooner, so only skip what every lane rules out.
+                    if next_candidate is None or lane_candidate < next_candidate:
+                        next_candidate = lane_candidate
+                if next_candidate == datetime.max:
+                    break
+                candidate = next_candidate
+        finally:
+            self.locks = chosen_locks
+        return slots
+
+    def find_available_slots(self, earliest_start=None, count=1, lanes=None):
+        return self.search_slots([timedelta(0)], earliest_start, count, lanes)
+
+    def find_available_series(self, earliest_start=None, count=1, lanes=None):
+        return self.search_slots([timedelta(days=i * self.interval) for i in range(self.repeats)], earliest_start, count, lanes)
+
+    def one_time_event_next_available_datetime(self, lanes=None):
+        slots = self.find_available_slots(self.start_datetime + CHECKPOINT_STEP, lanes=lanes)
+        self.error_messages = []
+        if slots:
+            self.start_datetime, self.end_datetime, self.locks = slots[0]
+            return True, "The selected datetime is unavailable", self.start_datetime, self.end_datetime
         return False, "No available datetime found in the next 60 days", None, None
     
-    def recurring_event_next_available_datetime(self):
-        while self.validate_recurrence_limits():
-            self.start_datetime += timedelta(hours=1)
-            self.end_datetime += timedelta(hours=1)
-            self.error_messages = []
-            if self.validate_recurrences()[0]:
-                return True, "The selected datetime is unavailable", self.start_datetime, self.end_datetime
+    def recurring_event_next_available_datetime(self, lanes=None, parallel=False):
+        if parallel:
+            # Imported here because the parallel search itself builds on this module.
+            from parallel import find_available_series
+            series = find_available_series(self, self.start_datetime + CHECKPOINT_STEP, lanes)
+        else:
+            series = self.find_available_series(self.start_datetime + CHECKPOINT_STEP, lanes=lanes)
+        self.error_messages = []
+        if series:
+            self.start_datetime, self.end_datetime, self.locks = series[0]
+            return True, "The selected datetime is unavailable", self.start_datetime, self.end_datetime
+        return False, "No available datetime found in the next 60 days", None, None
+
+reservation_lock = threading.RLock()
+
+def expand_event(data):
+    if data["type"] != "Recurring event":
+        return [dict(data)]
+    base_start = datetime.fromisoformat(data["start_datetime"])
+    base_end = datetime.fromisoformat(data["end_datetime"])
+    events_data = []
+    for i in range(data["repeats"]):
+        event_copy = data.copy()
+        event_copy["start_datetime"] = (base_start + timedelta(days=i * data["interval"])).isoformat()
+        event_copy["end_datetime"] = (base_end + timedelta(days=i * data["interval"])).isoformat()
+        events_data.append(event_copy)
+    return events_data
+
+def commit_events(events_data, expected_version=None):
+    with reservation_lock:
+        get_occupancy_index()
+        event_ids = get_event_store().insert_many(events_data, expected_version)
+        for event_id, event_data in zip(event_ids, events_data):
+            event_data["id"] = event_id
+    return event_ids
+
+def remove_event(event_id):
+    with reservation_lock:
+        get_occupancy_index()
+        return get_event_store().delete(event_id)
+
+def reserve_event(data, attempts=5):
+    event = Event(data)
+    # Durations, requirements and the horizon are checked here too: nothing else
+    # stops a caller of this API from oversubscribing resources.json.
+    if event.type == "Recurring event":
+        is_valid = event.static_validations_recurrences()
+    else:
+        is_valid = event.static_validations()
+    if not is_valid:
+        return False, event.error_messages, []
+    for attempt in range(attempts):
+        # The in-process lock keeps sessions of this server from interleaving; the
+        # expected version catches commits made by other processes in between.
+        with reservation_lock:
+            version = get_event_store().version()
+            event.error_messages = []
+            if event.type == "Recurring event":
+                is_valid = event.validate_recurrences()[0]
             else:
+                is_valid = event.validate_resources_availability()[0]
+            if not is_valid:
+                return False, event.error_messages, []
+            try:
+                return True, [], commit_events(expand_event(data), version)
+            except VersionConflict:
                 continue
-        return False, "No available datetime found in the next 60 days", None, None
\ No newline at end of file
+    return False, ["The schedule kept changing while the event was being reserved, please try again."], []
+
+SUGGESTION_LIMIT = 1000
+SUGGESTION_MAX_AGE = timedelta(hours=1)
+
+class SuggestionService:
+    # Holds the "next available" suggestions shown to users. A store change only
+    # sends back to the search the suggestions whose searched range it touches:
+    # a new event can only break the suggested windows themselves, so the search
+    # resumes from the suggestion; a deleted one may free an earlier slot, so the
+    # search restarts from the requested time.
+    def __init__(self, size=SUGGESTION_LIMIT, max_age=SUGGESTION_MAX_AGE):
+        self.size = size
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        self.keys = count(1)
+        self.index = None
+
+    def offsets(self, entry):
+        if entry["data"]["type"] == "Recurring event":
+            return [timedelta(days=i * entry["data"]["interval"]) for i in range(entry["data"]["repeats"])]
+        return [timedelta(0)]
+
+    def search(self, entry):
+        event = Event(entry["data"])
+        earliest = max(entry["search_from"], first_checkpoint(entry["earliest"], datetime.now(), CHECKPOINT_STEP))
+        slots = event.search_slots(self.offsets(entry), earliest, lanes=entry["lanes"])
+        entry["slot"] = slots[0] if slots else None
+        entry["search_from"] = entry["slot"][0] if entry["slot"] else earliest
+        entry["stale"] = False
+
+    def suggest(self, data, lanes=None, slot=None):
+        # A slot found elsewhere, such as by a service job, is kept without a search
+        # and checked again from its own start on the next current().
+        earliest = datetime.fromisoformat(data["start_datetime"]) + CHECKPOINT_STEP
+        entry = {"data": dict(data), "lanes": lanes, "earliest": earliest, "search_from": slot[0] if slot else earliest, "slot": slot, "stale": True}
+        with self.lock:
+            self.watch()
+            if slot is None:
+                self.search(entry)
+            if entry["slot"] is None:
+                return None, None
+            key = next(self.keys)
+            entry["used"] = datetime.now()
+            self.pending[key] = entry
+            self.expire()
+        return key, entry["slot"]
+
+    def current(self, key):
+        with self.lock:
+            self.watch()
+            entry = self.pending.get(key)
+            if entry is None:
+                return None
+            entry["used"] = datetime.now()
+            self.pending.move_to_end(key)
+            if entry["stale"]:
+                self.search(entry)
+            return entry["slot"]
+
+    def release(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def expire(self):
+        # Sessions that are closed while a suggestion is shown never release it,
+        # so the least recently used entries go once they are too old or too many.
+        oldest = datetime.now() - self.max_age
+        while self.pending:
+            key, entry = next(iter(self.pending.items()))
+            if len(self.pending) <= self.size and entry["used"] >= oldest:
+                break
+            del self.pending[key]
+
+    def watch(self):
+        index = get_occupancy_index()
+        if index is not self.index:
+            # Rebuilt after another process wrote: every suggestion may be affected.
+            self.index = index
+            get_event_store().subscribe(self.on_change)
+            for entry in self.pending.values():
+                entry["search_from"] = entry["earliest"]
+                entry["stale"] = True
+
+    def on_change(self, change, events_data):
+        changed = [(datetime.fromisoformat(event_data["start_datetime"]), datetime.fromisoformat(event_data["end_datetime"])) for event_data in events_data]
+        with self.lock:
+            for entry in self.pending.values():
+                if entry["slot"] is None:
+                    continue
+                duration = entry["slot"][1] - entry["slot"][0]
+                windows = [(entry["slot"][0] + offset, entry["slot"][0] + offset + duration) for offset in self.offsets(entry)]
+                if change == "create":
+                    if any(start < window_end and end > window_start for start, end in changed for window_start, window_end in windows):
+                        entry["stale"] = True
+                elif any(start < windows[-1][1] and end > entry["earliest"] for start, end in changed):
+                    entry["search_from"] = entry["earliest"]
+                    entry["stale"] = True
+
+suggestion_service = None
+
+def get_suggestion_service():
+    global suggestion_service
+    if suggestion_service is None:
+        suggestion_service = SuggestionService()
+    return suggestion_service
+
+def explanation_messages(explanation):
+    messages = []
+    recurring = any(conflict["occurrence"] > 1 for conflict in explanation["conflicts"])
+    for conflict in explanation["conflicts"]:
+        period = f"from {conflict['start_datetime'].strftime('%Y-%m-%d %H:%M')} to {conflict['end_datetime'].strftime('%Y-%m-%d %H:%M')}"
+        if conflict["lock"] is not None:
+            message = f"Lock {conflict['lock']} is already in use {period}"
+        else:
+            message = f"Not enough {RESOURCE_LABELS[conflict['resource']]} available {period}"
+        if conflict["blocking"]:
+            message += f", held by event{'s' if len(conflict['blocking']) > 1 else ''} {', '.join(conflict['blocking'])}"
+        if recurring:
+            message = f"Recurrence {conflict['occurrence']}: {message}"
+        messages.append(message + ".")
+    for suggestion in explanation["suggestions"]:
+        if suggestion["fix"] == "lane":
+            messages.append(f"Use lock{'s' if len(suggestion['locks']) > 1 else ''} {', '.join(suggestion['locks'])} instead, free for the whole event.")
+        elif suggestion["fix"] == "end":
+            hours = (suggestion["end_datetime"] - suggestion["start_datetime"]) / timedelta(hours=1)
+            messages.append(f"End at {suggestion['end_datetime'].strftime('%Y-%m-%d %H:%M')} instead, shortening the event to {hours:g} hours.")
+        elif suggestion["fix"] == "start":
+            hours = (suggestion["end_datetime"] - suggestion["start_datetime"]) / timedelta(hours=1)
+            messages.append(f"Start at {suggestion['start_datetime'].strftime('%Y-%m-%d %H:%M')} instead, shortening the event to {hours:g} hours.")
+        else:
+            messages.append(f"Move the event to start at {suggestion['start_datetime'].strftime('%Y-%m-%d %H:%M')}, the nearest free start with the same locks.")
+    return messages
+
+def validate_static_batch(events_data):
+    results = []
+    for data in events_data:
+        event = Event(data)
+        if event.type == "Recurring event":
+            event.static_validations_recurrences()
+        else:
+            event.static_validations()
+        results.append(event.error_messages)
+    return results
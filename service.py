@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import count
+from urllib.parse import urlsplit
+from archive import ARCHIVE_INTERVAL, archive_past_events
+from bulk import check_request
+import scheduler
+from storage import EventStore, get_event_store
+
+MAX_JOBS = 1000
+
+def check(data):
+    status, error_messages, slot = check_request(dict(data))
+    result = {"status": status, "errors": error_messages}
+    if slot is not None:
+        result.update({"start_datetime": slot[0].isoformat(), "end_datetime": slot[1].isoformat(), "locks": slot[2]})
+    return result
+
+def reserve(data):
+    is_reserved, error_messages, event_ids = scheduler.reserve_event(dict(data))
+    return {"reserved": is_reserved, "errors": error_messages, "ids": event_ids}
+
+def delete(event_id):
+    return {"deleted": scheduler.remove_event(event_id)}
+
+# Reads go to the worker pool and identical ones in flight share one result;
+# writes run one at a time in this process, next to the reservation lock.
+READS = {"check": check}
+WRITES = {"reserve": reserve, "delete": delete}
+
+class SchedulingService:
+    def __init__(self, workers=None):
+        event_store = get_event_store()
+        if workers == 0 or not isinstance(event_store, EventStore):
+            # The journal store lives in this process only, so searches stay here too.
+            self.readers = ThreadPoolExecutor(max(workers or 1, 1))
+        else:
+            self.readers = ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"))
+        self.writer = ThreadPoolExecutor(1)
+        self.in_flight = {}
+        self.jobs = OrderedDict()
+        self.job_ids = count(1)
+        self.stats = {"requests": 0, "coalesced": 0}
+
+    async def run(self, operation, payload):
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        if operation in WRITES:
+            return await loop.run_in_executor(self.writer, WRITES[operation], payload)
+        if operation not in READS:
+            raise ValueError(f"Unknown operation {operation}.")
+        key = (operation, json.dumps(payload, sort_keys=True), get_event_store().version())
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loop.run_in_executor(self.readers, READS[operation], payload))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self.in_flight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # One caller giving up must not cancel the search the others wait on.
+        return await asyncio.shield(task)
+
+    def submit(self, operation, payload):
+        job_id = str(next(self.job_ids))
+        self.jobs[job_id] = asyncio.ensure_future(self.run(operation, payload))
+        while len(self.jobs) > MAX_JOBS and next(iter(self.jobs.values())).done():
+            self.jobs.popitem(last=False)
+        return job_id
+
+    def poll(self, job_id):
+        task = self.jobs.get(job_id)
+        if task is None:
+            return None
+        if not task.done():
+            return {"job": job_id, "state": "pending"}
+        if task.exception() is not None:
+            return {"job": job_id, "state": "failed", "error": str(task.exception())}
+        return {"job": job_id, "state": "done", "result": task.result()}
+
+    async def submit_async(self, operation, payload):
+        return self.submit(operation, payload)
+
+    def close(self):
+        self.readers.shutdown(cancel_futures=True)
+        self.writer.shutdown()
+
+    async def maintain(self, interval=ARCHIVE_INTERVAL):
+        # Keeps the live store to the rolling horizon, on the writer like any write.
+        loop = asyncio.get_running_loop()
+        while True:
+            await loop.run_in_executor(self.writer, archive_past_events)
+            await asyncio.sleep(interval.total_seconds())
+
+    async def route(self, method, path, body):
+        parts = [part for part in urlsplit(path).path.split("/") if part]
+        if method == "GET" and parts == ["health"]:
+            return 200, {"ok": True, "jobs": len(self.jobs), "in_flight": len(self.in_flight), **self.stats}
+        if method == "POST" and parts == ["jobs"]:
+            return 202, {"job": self.submit(body.get("operation"), body.get("data"))}
+        if method == "GET" and len(parts) == 2 and parts[0] == "jobs":
+            status = self.poll(parts[1])
+            return (200, status) if status is not None else (404, {"error": f"Job {parts[1]} not found."})
+        if method == "POST" and parts in (["check"], ["reserve"]):
+            return 200, await self.run(parts[0], body)
+        if method == "DELETE" and len(parts) == 2 and parts[0] == "events":
+            return 200, await self.run("delete", parts[1])
+        return 404, {"error": f"No route for {method} {path}."}
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            raw_body = await reader.readexactly(length) if length else b""
+            try:
+                status, response = await self.route(request_line[0], request_line[1], json.loads(raw_body) if raw_body else {})
+            except (AttributeError, KeyError, TypeError, ValueError) as error:
+                status, response = 400, {"error": str(error)}
+            payload = json.dumps(response).encode("utf-8")
+            reason = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found"}[status]
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+        except (ConnectionError, IndexError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+class BackgroundService:
+    # Runs the service loop in a daemon thread so synchronous callers, such as
+    # Streamlit reruns, can submit jobs and poll them without blocking.
+    def __init__(self, workers=None):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.service = SchedulingService(workers)
+
+    def submit(self, operation, payload):
+        return asyncio.run_coroutine_threadsafe(self.service.submit_async(operation, payload), self.loop).result()
+
+    def poll(self, job_id):
+        return asyncio.run_coroutine_threadsafe(self.poll_async(job_id), self.loop).result()
+
+    async def poll_async(self, job_id):
+        return self.service.poll(job_id)
+
+background_service = None
+
+def get_background_service():
+    global background_service
+    if background_service is None:
+        background_service = BackgroundService()
+    return background_service
+
+async def serve(host, port, workers):
+    service = SchedulingService(workers)
+    server = await asyncio.start_server(service.handle, host, port)
+    maintenance = asyncio.ensure_future(service.maintain())
+    print(f"Scheduling service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        maintenance.cancel()
+        service.close()
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Serve event checks and reservations over local HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="Processes for checks and searches (0 keeps them in threads).")
+    arguments = parser.parse_args(arguments)
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.workers))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import scheduler
+from scheduler import RESOURCES, next_checkpoint
+
+HORIZON = timedelta(days=60)
+
+class Simulation:
+    def __init__(self, events_data=None, origin=None, horizon=HORIZON):
+        now = datetime.now()
+        self.origin = origin if origin is not None else next_checkpoint(now)
+        self.hours = horizon // scheduler.CHECKPOINT_STEP
+        self.locks = list(scheduler.resources_data["locks"])
+        lock_positions = {lock: position for position, lock in enumerate(self.locks)}
+        if events_data is None:
+            with scheduler.index_lock:
+                index = scheduler.get_occupancy_index()
+                events = [index.event(position) for position in index.overlapping(self.origin, self.origin + self.hours * scheduler.CHECKPOINT_STEP)]
+        else:
+            events = sorted(
+                (dict(event_data, start_datetime=datetime.fromisoformat(event_data["start_datetime"]), end_datetime=datetime.fromisoformat(event_data["end_datetime"])) for event_data in events_data),
+                key=lambda event: event["start_datetime"]
+            )
+        self.ids = [event.get("id") for event in events]
+        self.starts = np.array([-((self.origin - event["start_datetime"]) // scheduler.CHECKPOINT_STEP) for event in events], dtype=np.int64).clip(0, self.hours)
+        self.ends = np.array([-((self.origin - event["end_datetime"]) // scheduler.CHECKPOINT_STEP) for event in events], dtype=np.int64).clip(0, self.hours)
+        self.demand = np.array([[event[resource] or 0 for resource in RESOURCES] for event in events], dtype=np.int64).reshape(len(events), len(RESOURCES))
+        self.lanes = []
+        self.lane_options = []
+        self.classes = []
+        for event in events:
+            self.lanes.append(np.array([lock_positions[lock] for lock in event["locks"]], dtype=np.int64))
+            rule = scheduler.rule_for(event.get("subtype"), event.get("vessel_size"))
+            options = rule.lane_list if rule is not None else [event["locks"]]
+            self.lane_options.append([np.array([lock_positions[lock] for lock in lane], dtype=np.int64) for lane in options])
+        for position in range(len(events)):
+            self.classes.append((tuple(self.demand[position]), tuple(tuple(lane) for lane in self.lane_options[position]), int(self.ends[position] - self.starts[position])))
+
+    def hour(self, moment):
+        return int(min(max(-((self.origin - moment) // scheduler.CHECKPOINT_STEP), 0), self.hours))
+
+    def baseline_usage(self):
+        # Difference arrays turn every event into two scattered updates, and one
+        # cumulative sum expands them into the resource x hour matrix.
+        difference = np.zeros((len(RESOURCES), self.hours + 1), dtype=np.int64)
+        for position in range(len(RESOURCES)):
+            np.add.at(difference[position], self.starts, self.demand[:, position])
+            np.add.at(difference[position], self.ends, -self.demand[:, position])
+        return np.cumsum(difference, axis=1)[:, :self.hours]
+
+    def earliest_start(self, usage, lock_usage, capacity, position, earliest):
+        duration = self.ends[position] - self.starts[position]
+        over_capacity = (usage + self.demand[position][:, None] > capacity[:, None]).any(axis=0)
+        best = None
+        for lane in self.lane_options[position]:
+            blocked = over_capacity | (lock_usage[lane] > 0).any(axis=0)
+            running = np.concatenate(([0], np.cumsum(blocked)))
+            free = np.flatnonzero(running[earliest + duration:] - running[earliest:self.hours - duration + 1] == 0)
+            if free.size and (best is None or earliest + free[0] < best[0]):
+                best = (earliest + free[0], lane)
+        return best
+
+    def run(self, capacities=None, lock_outages=(), repack=True):
+        capacity = np.array([(capacities or {}).get(resource, scheduler.resources_data[resource]) for resource in RESOURCES], dtype=np.int64)
+        usage = np.zeros((len(RESOURCES), self.hours), dtype=np.int64)
+        lock_usage = np.zeros((len(self.locks), self.hours), dtype=np.int64)
+        for outage in lock_outages:
+            lock_usage[self.locks.index(outage["lock"]), self.hour(datetime.fromisoformat(outage["start_datetime"])):self.hour(datetime.fromisoformat(outage["end_datetime"]))] += 1
+        delays = []
+        rejected = []
+        # Usage only grows during a replay, so a start that failed for one class of
+        # event (same demand, lanes and duration) fails for every later one too.
+        search_from = {}
+        for position in range(len(self.ids)):
+            start, end = self.starts[position], self.ends[position]
+            if end <= start:
+                continue
+            lane = self.lanes[position]
+            fits = (usage[:, start:end] + self.demand[position][:, None] <= capacity[:, None]).all() and not lock_usage[lane, start:end].any()
+            if not fits:
+                placement = None
+                if repack:
+                    earliest = max(start, search_from.get(self.classes[position], 0))
+                    if earliest + (end - start) <= self.hours:
+                        placement = self.earliest_start(usage, lock_usage, capacity, position, earliest)
+                if placement is None:
+                    if repack:
+                        search_from[self.classes[position]] = self.hours
+                    rejected.append(self.ids[position])
+                    continue
+                new_start, lane = placement
+                search_from[self.classes[position]] = new_start
+                end = new_start + (end - start)
+                delays.append(new_start - start)
+                start = new_start
+            else:
+                delays.append(0)
+            usage[:, start:end] += self.demand[position][:, None]
+            lock_usage[lane, start:end] += 1
+        # Delays are counted in checkpoints, reported in hours.
+        delays = np.array(delays, dtype=np.int64) * (scheduler.CHECKPOINT_STEP / timedelta(hours=1))
+        return {
+            "accepted": int(delays.size),
+            "rejected": len(rejected),
+            "rejected_ids": rejected,
+            "delayed": int((delays > 0).sum()),
+            "delay_hours": {
+                "mean": float(delays.mean()) if delays.size else 0.0,
+                "p50": float(np.percentile(delays, 50)) if delays.size else 0.0,
+                "p90": float(np.percentile(delays, 90)) if delays.size else 0.0,
+                "max": float(delays.max()) if delays.size else 0.0
+            },
+            "utilization": {resource: float(usage[position].sum() / (capacity[position] * self.hours)) if capacity[position] else 0.0 for position, resource in enumerate(RESOURCES)},
+            "lock_utilization": {lock: float((lock_usage[position] > 0).mean()) for position, lock in enumerate(self.locks)}
+        }
+
+def run_scenarios(scenarios, events_data=None):
+    simulation = Simulation(events_data)
+    reports = []
+    for scenario in scenarios:
+        report = simulation.run(scenario.get("capacities"), scenario.get("lock_outages", ()), scenario.get("repack", True))
+        report["name"] = scenario.get("name")
+        reports.append(report)
+    return reports
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Replay the current schedule under alternate capacities without touching it.")
+    parser.add_argument("scenarios", help="JSON file with a list of scenarios: name, capacities, lock_outages and repack.")
+    arguments = parser.parse_args(arguments)
+    scenarios = json.loads(Path(arguments.scenarios).read_text())
+    for report in run_scenarios(scenarios):
+        report.pop("rejected_ids")
+        print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
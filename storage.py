@@ -0,0 +1,514 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, so there the journal is single-process by convention only.
+    fcntl = None
+
+EVENT_STORE_FILENAME = "events.db"
+
+json_cache = {}
+
+def load_json(filename):
+    stat = os.stat(filename)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = json_cache.get(filename)
+    if cached is None or cached[0] != signature:
+        cached = (signature, json.loads(Path(filename).read_text()))
+        if metrics.enabled:
+            metrics.count("config.file_reads")
+        json_cache[filename] = cached
+    return cached[1]
+
+EVENT_COLUMNS = [
+    "type",
+    "start_datetime",
+    "end_datetime",
+    "repeats",
+    "interval",
+    "subtype",
+    "vessel_size",
+    "junior_pilots",
+    "senior_pilots",
+    "maintenance_teams",
+    "tugboats",
+    "locks"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT,
+    start_datetime TEXT NOT NULL,
+    end_datetime TEXT NOT NULL,
+    repeats INTEGER,
+    interval INTEGER,
+    subtype TEXT,
+    vessel_size TEXT,
+    junior_pilots INTEGER,
+    senior_pilots INTEGER,
+    maintenance_teams INTEGER,
+    tugboats INTEGER,
+    locks TEXT
+);
+CREATE INDEX IF NOT EXISTS events_start_datetime ON events (start_datetime);
+CREATE INDEX IF NOT EXISTS events_end_datetime ON events (end_datetime);
+CREATE INDEX IF NOT EXISTS events_subtype ON events (subtype, vessel_size, start_datetime);
+CREATE TABLE IF NOT EXISTS event_locks (
+    event_id INTEGER NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+    lock TEXT NOT NULL,
+    PRIMARY KEY (lock, event_id)
+);
+CREATE INDEX IF NOT EXISTS event_locks_event_id ON event_locks (event_id);
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version (id, version) VALUES (1, 0);
+CREATE TABLE IF NOT EXISTS migrations (
+    filename TEXT PRIMARY KEY
+);
+"""
+
+class VersionConflict(Exception):
+    pass
+
+class StoreLocked(Exception):
+    pass
+
+class EventStore:
+    def __init__(self, filename="events.db"):
+        self.filename = filename
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        self.listeners = []
+
+    def subscribe(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def notify(self, change, events_data):
+        for listener in self.listeners:
+            listener(change, events_data)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    @contextmanager
+    def write_transaction(self, expected_version=None):
+        # BEGIN IMMEDIATE takes SQLite's write lock up front, so the version check
+        # and the writes that follow cannot interleave with another process.
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                if expected_version is not None and self.version() != expected_version:
+                    raise VersionConflict(f"Expected schedule version {expected_version}, found {self.version()}.")
+                yield
+                self.connection.execute("UPDATE store_version SET version = version + 1 WHERE id = 1")
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+
+    def row_to_event(self, row):
+        event = dict(row)
+        event["id"] = str(event["id"])
+        event["locks"] = json.loads(event["locks"])
+        return event
+
+    def insert_row(self, data, event_id=None):
+        values = [json.dumps(data.get("locks")) if column == "locks" else data.get(column) for column in EVENT_COLUMNS]
+        cursor = self.connection.execute(
+            f"INSERT INTO events (id, {', '.join(EVENT_COLUMNS)}) VALUES (?, {', '.join('?' for column in EVENT_COLUMNS)})",
+            [event_id] + values
+        )
+        event_id = cursor.lastrowid
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO event_locks (event_id, lock) VALUES (?, ?)",
+            [(event_id, lock) for lock in data.get("locks") or []]
+        )
+        return str(event_id)
+
+    def insert(self, data):
+        return self.insert_many([data])[0]
+
+    def insert_many(self, events_data, expected_version=None):
+        with self.write_transaction(expected_version):
+            event_ids = [self.insert_row(data) for data in events_data]
+        self.notify("create", [dict(data, id=event_id) for event_id, data in zip(event_ids, events_data)])
+        return event_ids
+
+    def delete(self, event_id, expected_version=None):
+        # A missing id writes nothing, so it must not move the version that
+        # concurrent reservations and bulk flushes check against.
+        with self.lock:
+            if self.get(event_id) is None:
+                return False
+            with self.write_transaction(expected_version):
+                event = self.get(event_id)
+                self.connection.execute("DELETE FROM events WHERE id = ?", (int(event_id),))
+        if event is None:
+            return False
+        self.notify("delete", [event])
+        return True
+
+    def delete_ended(self, before, archive=None):
+        # Removes every event over by `before`. archive is handed them inside the
+        # write transaction, so nothing is deleted before it has been kept.
+        before = before.isoformat()
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM events WHERE end_datetime <= ? LIMIT 1", (before,)).fetchone() is None:
+                return []
+            with self.write_transaction():
+                rows = self.connection.execute("SELECT * FROM events WHERE end_datetime <= ? ORDER BY start_datetime, id", (before,)).fetchall()
+                events_data = [self.row_to_event(row) for row in rows]
+                if archive is not None:
+                    archive(events_data)
+                self.connection.execute("DELETE FROM events WHERE end_datetime <= ?", (before,))
+        self.notify("delete", events_data)
+        return events_data
+
+    def external_version(self):
+        # data_version only moves when another connection commits, which is how
+        # other processes' writes become visible to the cached occupancy index.
+        with self.lock:
+            return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def version(self):
+        with self.lock:
+            return self.connection.execute("SELECT version FROM store_version WHERE id = 1").fetchone()[0]
+
+    def get(self, event_id):
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM events WHERE id = ?", (int(event_id),)).fetchone()
+        return self.row_to_event(row) if row is not None else None
+
+    def scan(self):
+        # Streams rows off the cursor, for callers that keep their own compact copy
+        # of the schedule.
+        with self.lock:
+            for row in self.connection.execute("SELECT * FROM events ORDER BY start_datetime, id"):
+                if metrics.enabled:
+                    metrics.count("store.rows_loaded")
+                yield self.row_to_event(row)
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def query(self, start_datetime=None, end_datetime=None, lock=None, subtype=None, vessel_size=None, limit=50, offset=0):
+        # One page of events matching the filters, plus how many match in total.
+        joins = ""
+        conditions = []
+        parameters = []
+        if lock is not None:
+            joins = " JOIN event_locks ON event_locks.event_id = events.id AND event_locks.lock = ?"
+            parameters.append(lock)
+        if start_datetime is not None:
+            conditions.append("events.end_datetime > ?")
+            parameters.append(start_datetime.isoformat())
+        if end_datetime is not None:
+            conditions.append("events.start_datetime < ?")
+            parameters.append(end_datetime.isoformat())
+        if subtype is not None:
+            conditions.append("events.subtype = ?")
+            parameters.append(subtype)
+        if vessel_size is not None:
+            conditions.append("events.vessel_size = ?")
+            parameters.append(vessel_size)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            total = self.connection.execute(f"SELECT COUNT(*) FROM events{joins}{where}", parameters).fetchone()[0]
+            rows = self.connection.execute(
+                f"SELECT events.* FROM events{joins}{where} ORDER BY events.start_datetime, events.id LIMIT ? OFFSET ?",
+                parameters + [limit, offset]
+            ).fetchall()
+        return total, [self.row_to_event(row) for row in rows]
+
+    def migrate_from_json(self, filename="events.json"):
+        path = Path(filename)
+        if not path.exists() or self.count() > 0:
+            return 0
+        # The store empties in normal use (deletes, archiving), so it remembers the
+        # import; a sequence row means an older store already held events.
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM migrations WHERE filename = ?", (path.name,)).fetchone() is not None:
+                return 0
+            if self.connection.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'events'").fetchone() is not None:
+                return 0
+        events_data = json.loads(path.read_text() or "[]")
+        migrated = 0
+        with self.write_transaction():
+            self.connection.execute("INSERT INTO migrations (filename) VALUES (?)", (path.name,))
+            for event_data in events_data:
+                if type(event_data) == str:
+                    next_id = int(event_data)
+                    self.connection.execute("DELETE FROM sqlite_sequence WHERE name = 'events'")
+                    self.connection.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('events', ?)", (next_id - 1,))
+                else:
+                    self.insert_row(event_data, int(event_data["id"]))
+                    migrated += 1
+        return migrated
+
+class JournalEventStore:
+    def __init__(self, filename="events.journal.jsonl", snapshot_filename=None, compact_after=1000):
+        self.filename = filename
+        self.snapshot_filename = snapshot_filename or str(Path(filename).with_suffix(".snapshot.json"))
+        self.compact_after = compact_after
+        self.lock = threading.RLock()
+        self.events = {}
+        self.next_id = 1
+        self.sequence = 0
+        self.journal_records = 0
+        self.migrated = False
+        self.compaction = None
+        self.listeners = []
+        self.lock_file = self.acquire()
+        self.replay()
+        self.journal = open(self.filename, "a", encoding="utf-8")
+
+    def acquire(self):
+        # Ids and sequence numbers live in this process's memory, so a second
+        # process appending to the same journal would hand out the same ones.
+        # The lock sits on its own file because compaction replaces the journal.
+        lock_file = open(f"{self.filename}.lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise StoreLocked(f"{self.filename} is already open in another event store.")
+        return lock_file
+
+    def close(self):
+        compaction = self.compaction
+        if compaction is not None:
+            compaction.join()
+        with self.lock:
+            self.journal.close()
+            self.lock_file.close()
+
+    def replay(self):
+        snapshot_path = Path(self.snapshot_filename)
+        if snapshot_path.exists():
+            snapshot = json.loads(snapshot_path.read_text())
+            self.events = {event["id"]: event for event in snapshot["events"]}
+            self.next_id = snapshot["next_id"]
+            self.sequence = snapshot["sequence"]
+            self.migrated = snapshot.get("migrated", False)
+        journal_path = Path(self.filename)
+        if not journal_path.exists():
+            return
+        complete = 0
+        with open(journal_path, "rb") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                complete += len(line)
+                self.journal_records += 1
+                if record["sequence"] <= self.sequence:
+                    continue
+                self.apply(record)
+        if complete < journal_path.stat().st_size:
+            # A torn final line from a crash mid-append never reached fsync. Cut it
+            # off, or the next append would be glued onto it and lost on replay.
+            with open(journal_path, "r+b") as journal:
+                journal.truncate(complete)
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def apply(self, record):
+        self.sequence = record["sequence"]
+        if record["op"] == "create":
+            event = record["event"]
+            self.events[event["id"]] = event
+            self.next_id = max(self.next_id, int(event["id"]) + 1)
+        elif record["op"] == "delete":
+            self.events.pop(record["id"], None)
+        elif record["op"] == "next_id":
+            self.next_id = max(self.next_id, record["next_id"])
+        elif record["op"] == "migrated":
+            self.migrated = True
+
+    def append(self, records):
+        for offset, record in enumerate(records, start=1):
+            record["sequence"] = self.sequence + offset
+        self.journal.write("".join(json.dumps(record) + "\n" for record in records))
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        for record in records:
+            self.apply(record)
+        self.journal_records += len(records)
+        if self.journal_records >= self.compact_after and self.compaction is None:
+            self.compaction = threading.Thread(target=self.compact, daemon=True)
+            self.compaction.start()
+
+    def insert(self, data):
+        return self.insert_many([data])[0]
+
+    def subscribe(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def notify(self, change, events_data):
+        for listener in self.listeners:
+            listener(change, events_data)
+
+    def check_version(self, expected_version):
+        if expected_version is not None and self.version() != expected_version:
+            raise VersionConflict(f"Expected schedule version {expected_version}, found {self.version()}.")
+
+    def insert_many(self, events_data, expected_version=None):
+        with self.lock:
+            self.check_version(expected_version)
+            records = []
+            for data in events_data:
+                event = {"id": str(self.next_id)}
+                event.update({column: data.get(column) for column in EVENT_COLUMNS})
+                self.next_id += 1
+                records.append({"op": "create", "event": event})
+            self.append(records)
+        self.notify("create", [dict(record["event"]) for record in records])
+        return [record["event"]["id"] for record in records]
+
+    def delete(self, event_id, expected_version=None):
+        with self.lock:
+            self.check_version(expected_version)
+            event = self.get(event_id)
+            if event is None:
+                return False
+            self.append([{"op": "delete", "id": str(event_id)}])
+        self.notify("delete", [event])
+        return True
+
+    def delete_ended(self, before, archive=None):
+        before = before.isoformat()
+        with self.lock:
+            events_data = sorted(
+                (dict(event) for event in self.events.values() if event["end_datetime"] <= before),
+                key=lambda event: (event["start_datetime"], int(event["id"]))
+            )
+            if not events_data:
+                return []
+            if archive is not None:
+                archive(events_data)
+            self.append([{"op": "delete", "id": event["id"]} for event in events_data])
+        self.notify("delete", events_data)
+        return events_data
+
+    def get(self, event_id):
+        with self.lock:
+            event = self.events.get(str(event_id))
+            return dict(event) if event is not None else None
+
+    def all(self):
+        with self.lock:
+            events_data = [dict(event) for event in self.events.values()]
+        events_data.sort(key=lambda event: (event["start_datetime"], int(event["id"])))
+        return events_data
+
+    def scan(self):
+        return iter(self.all())
+
+    def count(self):
+        return len(self.events)
+
+    def external_version(self):
+        # The journal lock keeps every other process out, so nothing changes behind our back.
+        return 0
+
+    def version(self):
+        return self.sequence
+
+    def query(self, start_datetime=None, end_datetime=None, lock=None, subtype=None, vessel_size=None, limit=50, offset=0):
+        start = start_datetime.isoformat() if start_datetime is not None else None
+        end = end_datetime.isoformat() if end_datetime is not None else None
+        matching = [
+            event for event in self.all()
+            if (start is None or event["end_datetime"] > start)
+            and (end is None or event["start_datetime"] < end)
+            and (lock is None or lock in event["locks"])
+            and (subtype is None or event["subtype"] == subtype)
+            and (vessel_size is None or event["vessel_size"] == vessel_size)
+        ]
+        return len(matching), matching[offset:offset + limit]
+
+    def write_atomically(self, filename, text):
+        temporary = f"{filename}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, filename)
+
+    def compact(self):
+        try:
+            with self.lock:
+                snapshot = {"next_id": self.next_id, "sequence": self.sequence, "migrated": self.migrated, "events": list(self.events.values())}
+                snapshot_text = json.dumps(snapshot)
+            # Serialising the snapshot happens outside the lock; records appended
+            # meanwhile carry a higher sequence and survive the journal rewrite.
+            self.write_atomically(self.snapshot_filename, snapshot_text)
+            with self.lock:
+                self.journal.close()
+                kept = []
+                with open(self.filename, encoding="utf-8") as journal:
+                    for line in journal:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            break
+                        if record["sequence"] > snapshot["sequence"]:
+                            kept.append(line)
+                self.write_atomically(self.filename, "".join(kept))
+                self.journal = open(self.filename, "a", encoding="utf-8")
+                self.journal_records = len(kept)
+        finally:
+            self.compaction = None
+
+    def migrate_from_json(self, filename="events.json"):
+        path = Path(filename)
+        # next_id past 1 means an older journal already held events.
+        if not path.exists() or self.count() > 0 or self.migrated or self.next_id > 1:
+            return 0
+        events_data = json.loads(path.read_text() or "[]")
+        records = [{"op": "migrated"}]
+        with self.lock:
+            for event_data in events_data:
+                if type(event_data) == str:
+                    records.append({"op": "next_id", "next_id": int(event_data)})
+                else:
+                    event = {"id": str(event_data["id"])}
+                    event.update({column: event_data.get(column) for column in EVENT_COLUMNS})
+                    records.append({"op": "create", "event": event})
+            self.append(records)
+        return len([record for record in records if record["op"] == "create"])
+
+def open_event_store(filename=EVENT_STORE_FILENAME):
+    if filename.endswith(".jsonl"):
+        return JournalEventStore(filename)
+    return EventStore(filename)
+
+event_store = None
+
+def get_event_store():
+    global event_store
+    if event_store is None:
+        event_store = open_event_store()
+        event_store.migrate_from_json()
+    return event_store
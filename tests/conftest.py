@@ -0,0 +1,68 @@
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+import pytest
+
+# The modules live at the repository root rather than in a package.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import scheduler
+import storage
+
+@pytest.fixture
+def event_store(request, tmp_path, monkeypatch):
+    # A fresh store per test, with the scheduler's cached index dropped with it.
+    # Tests ask for the journal store by parametrising this fixture indirectly.
+    store = storage.open_event_store(str(tmp_path / getattr(request, "param", "events.db")))
+    monkeypatch.setattr(storage, "event_store", store)
+    monkeypatch.setattr(scheduler, "occupancy_index", None)
+    monkeypatch.setattr(scheduler, "occupancy_version", None)
+    yield store
+    store.close()
+
+@pytest.fixture
+def make_event():
+    # A one-time event that passes the static validations unless changes say otherwise:
+    # the resources, first lane and shortest stay its restrictions allow, two days out.
+    def make_event(subtype="Transit", vessel_size="Small", start=None, hours=None, **changes):
+        rule = scheduler.rule_for(subtype, vessel_size)
+        if start is None:
+            start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=2)
+        hours = hours if hours is not None else rule.min_duration_hours
+        data = {
+            "type": "One-time event",
+            "start_datetime": start.isoformat(),
+            "end_datetime": (start + timedelta(hours=hours)).isoformat(),
+            "repeats": None,
+            "interval": None,
+            "subtype": subtype,
+            "vessel_size": vessel_size if subtype == "Transit" else None,
+            "locks": list(rule.lane_list[0])
+        }
+        data.update(rule.requirements)
+        data.update(changes)
+        return data
+    return make_event
+
+@pytest.fixture
+def random_events(make_event):
+    # Transits and maintenance on random lanes, lengths and quarter-hour starts,
+    # with no regard for capacity, so brute-force checks meet plenty of conflicts.
+    def random_events(count, seed=0, start=None, days=20):
+        generator = random.Random(seed)
+        if start is None:
+            start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        events_data = []
+        for _ in range(count):
+            subtype, vessel_size = generator.choice([("Transit", "Small"), ("Transit", "Medium"), ("Transit", "Large"), ("Lock maintenance", None)])
+            rule = scheduler.rule_for(subtype, vessel_size)
+            events_data.append(make_event(
+                subtype,
+                vessel_size,
+                start=start + timedelta(minutes=15 * generator.randrange(days * 96)),
+                hours=generator.randrange(rule.min_duration_hours * 4, rule.max_duration_hours * 4 + 1) / 4,
+                locks=list(generator.choice(rule.lane_list))
+            ))
+        return events_data
+    return random_events
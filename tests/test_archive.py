@@ -0,0 +1,33 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+import scheduler
+from archive import archive_past_events, query_archive, write_partitions
+
+@pytest.mark.parametrize("event_store", ["events.db", "events.journal.jsonl"], indirect=True)
+def test_archive_matches_a_brute_force_split(event_store, random_events, tmp_path):
+    now = datetime.now()
+    event_store.insert_many(random_events(600, seed=9, start=now - timedelta(days=45), days=60))
+    before = list(event_store.scan())
+    scheduler.get_occupancy_index()
+    directory = str(tmp_path / "archive")
+    ended = [event_data for event_data in before if event_data["end_datetime"] <= now.isoformat()]
+    assert archive_past_events(now, directory) == len(ended)
+    assert list(event_store.scan()) == [event_data for event_data in before if event_data["end_datetime"] > now.isoformat()]
+    assert scheduler.get_occupancy_index().columns() == scheduler.OccupancyIndex(event_store.scan()).columns()
+    # A run interrupted before the store committed archives the same events again.
+    write_partitions(ended[:50], directory)
+    generator = random.Random(10)
+    for _ in range(30):
+        start = now - timedelta(hours=generator.randrange(60 * 24))
+        end = start + timedelta(hours=generator.randrange(1, 20 * 24))
+        lock = generator.choice([None, "P1", "C2", "A3"])
+        subtype, vessel_size = generator.choice([(None, None), ("Transit", None), ("Transit", "Large"), ("Lock maintenance", None)])
+        expected = sorted(
+            event_data["id"] for event_data in ended
+            if event_data["end_datetime"] > start.isoformat() and event_data["start_datetime"] < end.isoformat()
+            and (lock is None or lock in event_data["locks"])
+            and (subtype is None or event_data["subtype"] == subtype)
+            and (vessel_size is None or event_data["vessel_size"] == vessel_size)
+        )
+        assert sorted(event["id"] for event in query_archive(start, end, lock, subtype, vessel_size, directory)) == expected
@@ -0,0 +1,19 @@
+import json
+from bulk import schedule_jsonl
+
+def test_malformed_lines_are_rejected_one_by_one(event_store, make_event):
+    transit = make_event()
+    without_tugboats = dict(transit)
+    del without_tugboats["tugboats"]
+    lines = [
+        dict(transit, vessel_size="Huge"),
+        dict(transit, vessel_size="Huge", locks=[]),
+        without_tugboats,
+        dict(transit, type="Recurring event", interval=1),
+        [1, 2],
+        transit
+    ]
+    results = list(schedule_jsonl(json.dumps(line) for line in lines))
+    assert [result["status"] for result in results] == ["rejected"] * 5 + ["accepted"]
+    assert all(result["errors"] for result in results[:5])
+    assert event_store.count() == 1
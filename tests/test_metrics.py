@@ -0,0 +1,16 @@
+import pytest
+import metrics
+import service
+
+@pytest.fixture
+def instrumented(event_store):
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+def test_callers_outside_the_scheduler_are_timed(instrumented, make_event):
+    event_id = service.reserve(make_event())["ids"][0]
+    service.delete(event_id)
+    assert {"scheduler.reserve_event", "scheduler.remove_event"} <= set(metrics.timings)
@@ -0,0 +1,63 @@
+import json
+from datetime import datetime
+import scheduler
+from bulk import optimize_jsonl
+from optimizer import optimize_batch
+
+def test_optimizer_commits_only_valid_events(event_store, make_event):
+    lines = [make_event(tugboats=6), make_event(tugboats=6)]
+    lines += [make_event("Transit", size) for size in ["Small", "Medium", "Large"] for _ in range(4)]
+    lines += [make_event("Lock maintenance", None, locks=[lock]) for lock in ["P1", "C2"]]
+    results = optimize_jsonl((json.dumps(line) for line in lines), time_limit=0.1)
+    assert [result["status"] for result in results[:2]] == ["rejected", "rejected"]
+    assert all(result["status"] == "accepted" for result in results[2:])
+    events_data = list(event_store.scan())
+    assert len(events_data) == len(lines) - 2
+    for event_data in events_data:
+        event = scheduler.Event(event_data)
+        assert event.static_validations(), event.error_messages
+    timeline = scheduler.capacity_timeline()
+    assert all((free >= 0).all() for free in timeline["free"].values())
+    assert all((used <= 1).all() for used in timeline["locks"].values())
+
+def test_malformed_lines_do_not_abort_the_batch(event_store, make_event):
+    transit = make_event()
+    without_tugboats = dict(transit)
+    del without_tugboats["tugboats"]
+    lines = [[1, 2], without_tugboats, dict(transit, vessel_size="Huge"), dict(transit, start_datetime="soon"), transit]
+    results = optimize_jsonl((json.dumps(line) for line in lines), time_limit=0.1)
+    assert [result["status"] for result in results] == ["rejected"] * 4 + ["accepted"]
+    assert all(result["errors"] for result in results[:4])
+    assert event_store.count() == 1
+
+def brute_earliest_fit(events_data, request, origin):
+    # Every grid start from the request's release and every allowed lane, checking
+    # the demanded resources and the lane's locks at each checkpoint.
+    step = scheduler.CHECKPOINT_STEP
+    rule = scheduler.rule_for(request["subtype"], request["vessel_size"])
+    lanes = [request["locks"]] if request["subtype"] == "Lock maintenance" else rule.lane_list
+    start = datetime.fromisoformat(request["start_datetime"])
+    duration = -((start - datetime.fromisoformat(request["end_datetime"])) // step)
+    candidate = origin + max(0, -((origin - start) // step)) * step
+    while True:
+        for lane in lanes:
+            fits = True
+            for hour in range(duration):
+                moment = (candidate + hour * step).isoformat()
+                active = [event_data for event_data in events_data if event_data["start_datetime"] <= moment < event_data["end_datetime"]]
+                if any(request[resource] and sum(event_data[resource] for event_data in active) + request[resource] > scheduler.resources_data[resource] for resource in scheduler.RESOURCES):
+                    fits = False
+                if any(lock in event_data["locks"] for event_data in active for lock in lane):
+                    fits = False
+            if fits:
+                return candidate, list(lane)
+        candidate += step
+
+def test_single_requests_get_the_earliest_feasible_start(event_store, random_events):
+    event_store.insert_many(random_events(150, seed=1))
+    events_data = list(event_store.scan())
+    for request in random_events(20, seed=8):
+        result = optimize_batch([request], "delay", time_limit=0)[0]
+        start = datetime.fromisoformat(result["start_datetime"])
+        origin = scheduler.next_checkpoint(datetime.now())
+        assert (start, result["locks"]) == brute_earliest_fit(events_data, request, origin)
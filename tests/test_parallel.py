@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+import parallel
+import scheduler
+
+def test_workers_search_with_the_parents_step(event_store, make_event, monkeypatch):
+    blocking = make_event(hours=7.5)
+    start = datetime.fromisoformat(blocking["start_datetime"])
+    event_store.insert(blocking)
+    shared = parallel.Snapshot(scheduler.get_occupancy_index())
+    step = timedelta(minutes=15)
+    task = {
+        "snapshot": shared.memory.name,
+        "layout": shared.layout,
+        "max_duration": shared.max_duration,
+        "lock_bits": dict(scheduler.lock_bits),
+        "event_kinds": list(scheduler.event_kinds),
+        "resources": scheduler.resources_data,
+        "step": step,
+        "search_id": 1,
+        "chunk": 0,
+        "event": make_event(start=start),
+        "offsets": [timedelta(0)],
+        "lanes": None,
+        "start": start,
+        "end": start + timedelta(days=1)
+    }
+    monkeypatch.setattr(parallel, "worker_control", [1, parallel.NO_CHUNK])
+    monkeypatch.setattr(parallel, "worker_memory", None)
+    try:
+        slot = parallel.search_chunk(task)
+        assert scheduler.CHECKPOINT_STEP == step
+    finally:
+        # The pinned index and the cache entries stamped with it hold views of the block.
+        scheduler.pinned_index = None
+        scheduler.availability_cache.clear()
+        parallel.worker_memory.close()
+        shared.release()
+        scheduler.refresh_config()
+    # With the worker's own hourly step the search would resume at 8:00.
+    assert slot[0] == start + timedelta(hours=7.5)
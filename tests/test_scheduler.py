@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+import scheduler
+from scheduler import RESOURCE_LABELS, RESOURCES
+
+def active_at(events_data, moment):
+    moment = moment.isoformat()
+    return [event_data for event_data in events_data if event_data["start_datetime"] <= moment < event_data["end_datetime"]]
+
+def brute_conflicts(events_data, event, start, end):
+    # Every checkpoint of the window summed from scratch, as before the sweep.
+    found = []
+    checkpoint = start
+    while checkpoint < end:
+        active = active_at(events_data, checkpoint)
+        exceeded = [RESOURCE_LABELS[resource] for resource in RESOURCES if sum(event_data[resource] for event_data in active) + getattr(event, resource) > scheduler.resources_data[resource]]
+        busy_locks = [lock for lock in event.locks if any(lock in event_data["locks"] for event_data in active)]
+        if exceeded or busy_locks:
+            found.append((checkpoint, exceeded, busy_locks))
+        checkpoint += scheduler.CHECKPOINT_STEP
+    return found
+
+def brute_slots(events_data, event, offsets, earliest_start, lanes, count=1):
+    # Every candidate start on the grid, every lane in turn, without any jumps.
+    duration = event.end_datetime - event.start_datetime
+    horizon_end = datetime.now() + timedelta(days=60)
+    chosen_locks = event.locks
+    slots = []
+    candidate = earliest_start
+    while len(slots) < count and candidate + offsets[-1] + duration <= horizon_end:
+        for lane in lanes:
+            event.locks = list(lane)
+            if not any(brute_conflicts(events_data, event, candidate + offset, candidate + offset + duration) for offset in offsets):
+                slots.append((candidate, candidate + duration, list(lane)))
+                break
+        candidate += scheduler.CHECKPOINT_STEP
+    event.locks = chosen_locks
+    return slots
+
+def test_reserve_event_rejects_what_static_validation_rejects(event_store, make_event):
+    transit = make_event("Transit", "Large")
+    start = datetime.fromisoformat(transit["start_datetime"])
+    assert not scheduler.reserve_event(dict(transit, senior_pilots=5, tugboats=9))[0]
+    assert not scheduler.reserve_event(make_event("Transit", "Large", start=start - timedelta(days=5)))[0]
+    assert event_store.count() == 0
+    assert scheduler.reserve_event(transit)[0]
+    assert event_store.count() == 1
+
+def test_suggestions_left_behind_are_expired(event_store, make_event):
+    service = scheduler.SuggestionService(size=2)
+    keys = [service.suggest(make_event())[0] for _ in range(3)]
+    assert list(service.pending) == keys[1:]
+    assert service.current(keys[0]) is None
+    service.pending[keys[1]]["used"] -= scheduler.SUGGESTION_MAX_AGE * 2
+    service.current(keys[2])
+    service.suggest(make_event())
+    assert keys[1] not in service.pending
+
+def test_index_reads_are_not_torn_by_writes_from_another_thread(event_store, make_event):
+    start = datetime.fromisoformat(make_event()["start_datetime"])
+    events_data = [dict(make_event(start=start + timedelta(hours=hour)), id=str(hour + 1)) for hour in range(0, 400, 3)]
+    index = scheduler.get_occupancy_index()
+    stop = threading.Event()
+    def write():
+        while not stop.is_set():
+            scheduler.apply_store_change("create", events_data)
+            scheduler.apply_store_change("delete", events_data)
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        deadline = time.perf_counter() + 0.5
+        while time.perf_counter() < deadline:
+            scheduler.capacity_timeline()
+            event = scheduler.Event(make_event(start=start + timedelta(hours=24)))
+            event.validate_resources_availability()
+            event.explain_conflicts(search=False)
+    finally:
+        stop.set()
+        writer.join()
+    assert len(index) == 0
+
+def test_sweep_matches_checkpoint_by_checkpoint_sums(event_store, random_events):
+    event_store.insert_many(random_events(150, seed=1))
+    events_data = list(event_store.scan())
+    for data in random_events(150, seed=2):
+        event = scheduler.Event(data)
+        assert event.scan_conflicts(event.start_datetime, event.end_datetime) == brute_conflicts(events_data, event, event.start_datetime, event.end_datetime)
+        boundaries = [event.start_datetime] + [datetime.fromisoformat(event_data[key]) for event_data in events_data for key in ("start_datetime", "end_datetime")]
+        moments = [moment for moment in boundaries if event.start_datetime <= moment < event.end_datetime]
+        peak = {resource: max(sum(event_data[resource] for event_data in active_at(events_data, moment)) for moment in moments) for resource in RESOURCES}
+        assert scheduler.get_occupancy_index().peak_usage(event.start_datetime, event.end_datetime) == peak
+
+def test_jump_search_finds_the_first_free_slots(event_store, random_events):
+    event_store.insert_many(random_events(150, seed=1))
+    events_data = list(event_store.scan())
+    for data in random_events(30, seed=3):
+        event = scheduler.Event(data)
+        earliest = event.start_datetime + scheduler.CHECKPOINT_STEP
+        lanes = event.lane_options()
+        assert event.find_available_slots(earliest, count=3, lanes=lanes) == brute_slots(events_data, event, [timedelta(0)], earliest, lanes, count=3)
+        assert event.find_available_slots(earliest) == brute_slots(events_data, event, [timedelta(0)], earliest, [event.locks])
+
+def test_series_search_and_validation_match_a_full_walk(event_store, random_events):
+    event_store.insert_many(random_events(150, seed=1))
+    events_data = list(event_store.scan())
+    generator = random.Random(4)
+    for data in random_events(15, seed=5, days=10):
+        data.update(type="Recurring event", repeats=generator.randint(2, 5), interval=generator.randint(1, 4))
+        event = scheduler.Event(data)
+        offsets = [timedelta(days=i * event.interval) for i in range(event.repeats)]
+        duration = event.end_datetime - event.start_datetime
+        expected_valid = not any(brute_conflicts(events_data, event, event.start_datetime + offset, event.start_datetime + offset + duration) for offset in offsets)
+        assert event.validate_recurrences()[0] == expected_valid
+        earliest = event.start_datetime + scheduler.CHECKPOINT_STEP
+        lanes = event.lane_options()
+        assert event.find_available_series(earliest, lanes=lanes) == brute_slots(events_data, event, offsets, earliest, lanes)
+
+def brute_ranges(events_data, event, windows):
+    # Conflicting checkpoints merged per resource and lock, one window at a time.
+    step = scheduler.CHECKPOINT_STEP
+    ranges = []
+    for occurrence, (start, end) in enumerate(windows, start=1):
+        open_ranges = {}
+        window_ranges = []
+        for checkpoint, exceeded, busy_locks in brute_conflicts(events_data, event, start, end):
+            blocked = [(resource, None) for resource in RESOURCES if RESOURCE_LABELS[resource] in exceeded] + [(None, lock) for lock in busy_locks]
+            for resource, lock in blocked:
+                current = open_ranges.get((resource, lock))
+                if current is not None and current["last"] + step == checkpoint:
+                    current["last"] = checkpoint
+                    continue
+                current = open_ranges[(resource, lock)] = {"occurrence": occurrence, "resource": resource, "lock": lock, "first": checkpoint, "last": checkpoint}
+                window_ranges.append(current)
+        for current in window_ranges:
+            first, last = current.pop("first").isoformat(), current.pop("last")
+            current["start_datetime"] = datetime.fromisoformat(first)
+            current["end_datetime"] = min(last + step, end)
+            current["blocking"] = sorted(
+                event_data["id"] for event_data in events_data
+                if event_data["start_datetime"] <= last.isoformat() and event_data["end_datetime"] > first
+                and (event_data[current["resource"]] if current["resource"] else current["lock"] in event_data["locks"])
+            )
+            ranges.append(current)
+    return ranges
+
+def test_explained_conflicts_match_and_every_fix_clears_them(event_store, random_events):
+    event_store.insert_many(random_events(40, seed=1))
+    events_data = list(event_store.scan())
+    generator = random.Random(6)
+    fixes = set()
+    for data in random_events(40, seed=7, days=12):
+        # The longest stay leaves room to suggest a shorter one.
+        rule = scheduler.rule_for(data["subtype"], data["vessel_size"])
+        data["end_datetime"] = (datetime.fromisoformat(data["start_datetime"]) + timedelta(hours=rule.max_duration_hours)).isoformat()
+        if generator.random() < 0.3:
+            data.update(type="Recurring event", repeats=generator.randint(2, 4), interval=generator.randint(1, 3))
+        event = scheduler.Event(data)
+        offsets = [timedelta(days=i * event.interval) for i in range(event.repeats)] if event.type == "Recurring event" else [timedelta(0)]
+        duration = event.end_datetime - event.start_datetime
+        explanation = event.explain_conflicts(offsets)
+        conflicts = [dict(conflict, blocking=sorted(conflict["blocking"])) for conflict in explanation["conflicts"]]
+        assert conflicts == brute_ranges(events_data, event, [(event.start_datetime + offset, event.start_datetime + offset + duration) for offset in offsets])
+        for suggestion in explanation["suggestions"]:
+            fixes.add(suggestion["fix"])
+            fixed = scheduler.Event(dict(data, locks=suggestion.get("locks", data["locks"])))
+            start = suggestion.get("start_datetime", event.start_datetime)
+            end = suggestion.get("end_datetime", start + duration)
+            assert not any(brute_conflicts(events_data, fixed, start + offset, end + offset) for offset in offsets), suggestion
+    assert fixes == {"lane", "end", "start", "move"}
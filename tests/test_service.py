@@ -0,0 +1,42 @@
+import asyncio
+import time
+from datetime import datetime
+import pytest
+from scheduler import SuggestionService
+from service import BackgroundService, SchedulingService
+
+@pytest.fixture
+def service(event_store):
+    service = SchedulingService(workers=0)
+    yield service
+    service.close()
+
+def test_reserve_route_validates_requirements(service, event_store, make_event):
+    data = make_event(tugboats=2)
+    status, response = asyncio.run(service.route("POST", "/reserve", data))
+    assert status == 200 and not response["reserved"] and response["errors"]
+    assert event_store.count() == 0
+    status, response = asyncio.run(service.route("POST", "/reserve", dict(data, tugboats=1)))
+    assert status == 200 and response["reserved"]
+    assert event_store.count() == 1
+
+def test_background_search_feeds_the_suggestion_service(event_store, make_event):
+    blocking = make_event()
+    event_store.insert(blocking)
+    background = BackgroundService(workers=0)
+    try:
+        job = background.submit("check", blocking)
+        deadline = time.perf_counter() + 5
+        while background.poll(job)["state"] == "pending" and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        result = background.poll(job)["result"]
+    finally:
+        background.service.close()
+        background.loop.call_soon_threadsafe(background.loop.stop)
+    assert result["status"] == "suggested"
+    slot = (datetime.fromisoformat(result["start_datetime"]), datetime.fromisoformat(result["end_datetime"]), result["locks"])
+    suggestions = SuggestionService()
+    key, kept = suggestions.suggest(blocking, slot=slot)
+    assert suggestions.current(key) == slot
+    event_store.insert(dict(blocking, start_datetime=result["start_datetime"], end_datetime=result["end_datetime"]))
+    assert suggestions.current(key)[0] > slot[0]
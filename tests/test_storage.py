@@ -0,0 +1,58 @@
+import json
+import pytest
+from storage import JournalEventStore, StoreLocked, open_event_store
+
+def test_journal_recovers_from_torn_append(tmp_path, make_event):
+    event = make_event()
+    filename = str(tmp_path / "events.journal.jsonl")
+    store = JournalEventStore(filename)
+    store.insert_many([event, event])
+    store.journal.write('{"op": "create", "event": {"id": "3", "sta')
+    store.close()
+
+    store = JournalEventStore(filename)
+    assert store.insert_many([event, event]) == ["3", "4"]
+    store.close()
+
+    store = JournalEventStore(filename)
+    assert sorted(store.events) == ["1", "2", "3", "4"]
+    store.close()
+
+@pytest.mark.parametrize("name", ["events.db", "events.journal.jsonl"])
+def test_migration_runs_once(tmp_path, make_event, name):
+    event = make_event()
+    legacy = tmp_path / "events.json"
+    legacy.write_text(json.dumps([dict(event, id="1"), dict(event, id="2"), "3"]))
+    store = open_event_store(str(tmp_path / name))
+    assert store.migrate_from_json(str(legacy)) == 2
+    store.delete("1")
+    store.delete("2")
+    store.close()
+
+    store = open_event_store(str(tmp_path / name))
+    assert store.migrate_from_json(str(legacy)) == 0
+    assert store.count() == 0
+    store.close()
+
+def test_journal_is_held_by_one_store_at_a_time(tmp_path, make_event):
+    filename = str(tmp_path / "events.journal.jsonl")
+    store = JournalEventStore(filename)
+    with pytest.raises(StoreLocked):
+        JournalEventStore(filename)
+    assert store.insert(make_event()) == "1"
+    store.close()
+
+    store = JournalEventStore(filename)
+    assert store.insert(make_event()) == "2"
+    store.close()
+
+@pytest.mark.parametrize("name", ["events.db", "events.journal.jsonl"])
+def test_deleting_a_missing_event_keeps_the_version(tmp_path, make_event, name):
+    store = open_event_store(str(tmp_path / name))
+    event_id = store.insert(make_event())
+    version = store.version()
+    assert not store.delete("99")
+    assert store.version() == version
+    assert store.delete(event_id)
+    assert store.version() != version
+    store.close()